@@ -2,6 +2,8 @@ import streamlit as st
 import logging
 import os
 
+from src.utils.metrics import configure_metrics
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -13,6 +15,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("frontend")
 
+# Expose per-stage latency metrics (no-op unless METRICS_PORT/METRICS_DUMP_PATH is set)
+configure_metrics()
+
 pages = {
     "首頁": [
         st.Page(
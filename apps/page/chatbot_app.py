@@ -1,8 +1,9 @@
 import os
 import time
 import uuid
+from src.utils.catalog import get_catalog, load_catalogs
+from src.utils.data_access import get_many, get_redis
 from src.utils.redis_handler import RedisHandler
-import redis
 from typing import Dict, List
 
 import streamlit as st
@@ -10,94 +11,37 @@ from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 
 from src.agents.rag_agent import SelfRAGWorkflow
 from src.agents.supervisor_agent import SupervisorAgent
+from src.services.asr import transcribe, transcribe_streaming
+from src.tools.audio_processing import EmptyAudioError
+from src.tools.vector_store import prefetcher
+from src.utils.feedback_cache import FeedbackStore, transcript_digest
+from src.utils.job_queue import get_job_queue
 from src.utils.log_handler import setup_logger
-from google.genai import Client, types
-from google.genai.types import GenerateContentConfig
+from src.utils.session_store import SessionStore
+from src.utils.transcript_store import TranscriptStore
+from src.utils.transcription_cache import audio_digest
+from src.utils.metrics import instrument
 
 
 # Initialize logger
 logger = setup_logger(__name__)
 
-# audio_worker = AudioToText()
-autio_client = Client(api_key=os.getenv("GOOGLE_API_KEY", ""))
-
-
-def audio_to_text(audio_file_object):
-    response = autio_client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[
-            "請將語音轉換為文字。",
-            types.Part.from_bytes(
-                data=audio_file_object,
-                mime_type="audio/wav",
-            ),
-        ],
-        config=GenerateContentConfig(temperature=0.1),
-    )
-    return response.text
-
-
-# redis
-@st.cache_resource
-def get_redis_scenarios_connection():
-    try:
-        r = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=6379,
-            db=0,
-            decode_responses=True,  # Automatically decode response bytes to strings
-        )
-        return r
-    except Exception as e:
-        st.error(f"Failed to connect to Redis: {e}")
-        return None
-
-
-@st.cache_resource
-def get_redis_vector_search_connection():
-    try:
-        r = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=6379,
-            db=1,
-            decode_responses=True,  # Automatically decode response bytes to strings
-        )
-        return r
-    except Exception as e:
-        st.error(f"Failed to connect to Redis: {e}")
-        return None
-
-
-@st.cache_resource
-def get_redis_superviser_connection():
-    try:
-        r = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=6379,
-            db=2,
-            decode_responses=True,  # Automatically decode response bytes to strings
-        )
-        return r
-    except Exception as e:
-        st.error(f"Failed to connect to Redis: {e}")
-        return None
-
 
-redis_scenario_handler = RedisHandler(get_redis_scenarios_connection())
-redis_vector_search_handler = RedisHandler(get_redis_vector_search_connection())
-redis_supervisor_handler = RedisHandler(get_redis_superviser_connection())
+@instrument("asr", "audio_to_text")
+def audio_to_text(audio_file_object, digest=None):
+    if os.getenv("VOICE_PIPELINE", "true").lower() in ("1", "true", "yes"):
+        # Start retrieving on the transcript while it is still streaming in
+        return transcribe_streaming(audio_file_object, digest, prefetcher.prefetch)
+    return transcribe(audio_file_object, digest)
 
 
-def get_all_keys(r):
-    if r:
-        return r.keys("*")
-    return []
-
-
-def get_value(r, key):
-    if r:
-        return r.get(key)
-    return None
+# redis: one shared connection pool, see src/utils/data_access.py
+redis_scenario_handler = get_catalog("scenarios")
+redis_vector_search_handler = get_catalog("knowledge_bases")
+redis_supervisor_handler = get_catalog("supervisor")
+feedback_store = FeedbackStore(get_redis())
+transcript_store = TranscriptStore(get_redis())
+session_store = SessionStore(get_redis(), ttl=int(os.getenv("SESSION_TTL", 86400)))
 
 
 api_key = os.getenv("GOOGLE_API_KEY", "")
@@ -121,6 +65,47 @@ def convert_to_langchain_messages(messages: List[Dict]) -> List[BaseMessage]:
     return lc_messages
 
 
+def use_workers() -> bool:
+    """Whether chat turns and evaluations run on the worker service."""
+    return os.getenv("CHAT_EXECUTION", "inline") == "worker"
+
+
+def submit_chat_turn() -> str:
+    """Run the chat turn on a worker and wait for the reply.
+
+    The job id is the session and turn number, so a rerun while the turn is
+    in flight waits for the same job instead of submitting it again.
+    """
+    queue = get_job_queue()
+    job_id = queue.submit(
+        "chat_turn",
+        {
+            "session_id": st.session_state.chat_session_id,
+            "scenarios_description": st.session_state.scenarios_description,
+            "vector_key": st.session_state.session_vector_search_key,
+            "messages": st.session_state.messages,
+        },
+        job_id=f"chat_turn:{st.session_state.chat_session_id}:{len(st.session_state.messages)}",
+    )
+    with st.spinner("思考中..."):
+        return queue.wait(job_id)["content"]
+
+
+def submit_evaluation(digest: str) -> Dict:
+    """Run the supervisor evaluation of the transcript on a worker."""
+    queue = get_job_queue()
+    job_id = queue.submit(
+        "evaluate",
+        {
+            "scenarios_description": st.session_state.scenarios_description,
+            "supervisor_instructions": st.session_state.supervisor_instructions,
+            "messages": st.session_state.messages,
+        },
+        job_id=f"evaluate:{digest}",
+    )
+    return queue.wait(job_id)
+
+
 # --- Initialization & API Key Configuration ---
 def initialize_session_state():
     """Initializes session state variables if they don't exist."""
@@ -136,12 +121,71 @@ def initialize_session_state():
         st.session_state.time_up = False
         st.session_state.langchain_chat = None
         st.session_state.supervisor_agent = None
+        st.session_state.scenarios_description = None
+        st.session_state.supervisor_instructions = None
+        st.session_state.feedback_cache = {}
+        st.session_state.transcript_saved = False
         st.session_state.chat_session_id = None
         st.session_state.scenarios_key = None
         st.session_state.supervisor_key = None
         st.session_state.vector_search_key = None
-        st.session_state.last_audio = None
+        # Keys the running session was started with; the selectors above
+        # only configure the next session
+        st.session_state.session_scenarios_key = None
+        st.session_state.session_supervisor_key = None
+        st.session_state.session_vector_search_key = None
+        st.session_state.last_audio_digest = None
         st.session_state.last_text = None
+        st.session_state.supervisor_state = None
+        restore_session()
+
+
+def restore_session():
+    """Resume the session named by the "sid" URL parameter, which may have
+    been started on another replica, or start a new one."""
+    sid = st.query_params.get("sid")
+    stored = session_store.load(sid) if sid else None
+    if stored is None:
+        sid = sid or str(uuid.uuid4())
+        st.query_params["sid"] = sid
+    else:
+        logger.info(f"Restoring session {sid}")
+        for field, value in stored.items():
+            st.session_state[field] = value
+    st.session_state.sid = sid
+    st.session_state.persisted_session = None
+
+    if st.session_state.timer_running or st.session_state.time_up:
+        RedisHandler.set_current_key(st.session_state.session_vector_search_key)
+        build_agents()
+
+
+def build_agents():
+    """Create the session's agents from its persisted state."""
+    st.session_state.langchain_chat = SelfRAGWorkflow(
+        session_id=st.session_state.chat_session_id,
+        scenarios_description=st.session_state.scenarios_description,
+    )
+    st.session_state.supervisor_agent = SupervisorAgent(
+        scenarios_description=st.session_state.scenarios_description,
+        supervisor_instructions=st.session_state.supervisor_instructions,
+    )
+    if st.session_state.supervisor_state:
+        st.session_state.supervisor_agent.restore_state(
+            st.session_state.supervisor_state
+        )
+
+
+def persist_session():
+    """Save the session to Redis if it changed since the last save."""
+    if st.session_state.supervisor_agent:
+        st.session_state.supervisor_state = (
+            st.session_state.supervisor_agent.export_state()
+        )
+    payload = SessionStore.dumps(st.session_state)
+    if payload != st.session_state.persisted_session:
+        session_store.save(st.session_state.sid, payload)
+        st.session_state.persisted_session = payload
 
 
 initialize_session_state()
@@ -156,6 +200,39 @@ def format_time(seconds):
     return f"{minutes:02d}:{secs:02d}"
 
 
+def end_chat_session():
+    logger.info("Time's up for chat session")
+    st.session_state.timer_running = False
+    st.session_state.time_up = True
+
+
+@st.fragment(run_every=1)
+def render_timer():
+    """Countdown and progress bar, rerun every second without the rest of the page."""
+    if not st.session_state.timer_running:
+        return
+    elapsed_time = time.time() - st.session_state.start_time
+    remaining_time = st.session_state.duration_seconds - elapsed_time
+    progress = min(1.0, elapsed_time / st.session_state.duration_seconds)
+
+    st.metric("Time Remaining", format_time(remaining_time))
+    st.progress(progress)
+
+    quarter_time_threshold = st.session_state.duration_seconds * 0.25
+    if remaining_time <= quarter_time_threshold:
+        warning_minutes = round(quarter_time_threshold / 60, 1)
+        if not st.session_state.warning_sent:
+            logger.info(f"Time warning: less than {warning_minutes} minutes remaining")
+            st.session_state.warning_sent = True
+        st.warning(f"⏳ Time remaining is less than {warning_minutes} minutes!")
+
+    if remaining_time <= 0:
+        # Only now does the whole page rerun, to switch to the feedback phase
+        end_chat_session()
+        persist_session()
+        st.rerun(scope="app")
+
+
 def reset_app():
     logger.info("Resetting application state")
     st.session_state.timer_running = False
@@ -166,12 +243,21 @@ def reset_app():
     st.session_state.time_up = False
     st.session_state.langchain_chat = None
     st.session_state.supervisor_agent = None
+    st.session_state.scenarios_description = None
+    st.session_state.supervisor_instructions = None
+    st.session_state.feedback_cache = {}
+    st.session_state.transcript_saved = False
     st.session_state.chat_session_id = None
     st.session_state.scenarios_key = None
     st.session_state.supervisor_key = None
     st.session_state.vector_search_key = None
-    st.session_state.last_audio = None
+    st.session_state.session_scenarios_key = None
+    st.session_state.session_supervisor_key = None
+    st.session_state.session_vector_search_key = None
+    st.session_state.last_audio_digest = None
     st.session_state.last_text = None
+    st.session_state.supervisor_state = None
+    persist_session()
     # Clear potential widget states explicitly if needed (optional)
     # if 'duration_input' in st.session_state: del st.session_state['duration_input']
     st.rerun()
@@ -203,23 +289,23 @@ def start_chat_session():
                 st.stop()
                 return
 
-            scenarios_description = redis_scenario_handler.get_value(
-                st.session_state.scenarios_key
-            )
-
-            supervisor_instructions = redis_supervisor_handler.get_value(
-                st.session_state.supervisor_key
+            # Both in one round-trip
+            scenarios_description, supervisor_instructions = get_many(
+                [
+                    ("scenarios", st.session_state.scenarios_key),
+                    ("supervisor", st.session_state.supervisor_key),
+                ]
             )
 
-            st.session_state.langchain_chat = SelfRAGWorkflow(
-                session_id=st.session_state.chat_session_id,
-                scenarios_description=scenarios_description,
-            )
-
-            st.session_state.supervisor_agent = SupervisorAgent(
-                scenarios_description=scenarios_description,
-                supervisor_instructions=supervisor_instructions,
+            st.session_state.scenarios_description = scenarios_description
+            st.session_state.supervisor_instructions = supervisor_instructions
+            st.session_state.session_scenarios_key = st.session_state.scenarios_key
+            st.session_state.session_supervisor_key = st.session_state.supervisor_key
+            st.session_state.session_vector_search_key = (
+                st.session_state.vector_search_key
             )
+            st.session_state.supervisor_state = None
+            build_agents()
 
             st.session_state.messages = [
                 {
@@ -227,6 +313,7 @@ def start_chat_session():
                     "content": "Timer started! You can begin chatting.",
                 }
             ]
+            persist_session()
             st.rerun()
         except Exception as e:
             logger.error(
@@ -275,7 +362,6 @@ st.title("智能陪練機器人")
 config_placeholder = st.empty()
 # Keep other placeholders
 timer_display_placeholder = st.empty()
-progress_bar_placeholder = st.empty()
 chat_placeholder = st.container()
 final_message_placeholder = st.empty()
 
@@ -302,6 +388,7 @@ if not st.session_state.timer_running and not st.session_state.time_up:
                 f"Chat duration changed from {current_duration} to {new_duration} minutes"
             )
             st.session_state.timer_duration_minutes = new_duration
+            persist_session()
             st.rerun()  # Rerun if duration changes to reflect it immediately
 
         # Add a unique key to the button
@@ -318,28 +405,13 @@ else:
 
 # --- Running Phase (Timer Active) ---
 if st.session_state.timer_running:
-    # (Your existing timer logic, warning logic, time up check, and chat interface)
-    # ... (make sure this section is correctly indented) ...
-    elapsed_time = time.time() - st.session_state.start_time
-    remaining_time = st.session_state.duration_seconds - elapsed_time
-    progress = min(1.0, elapsed_time / st.session_state.duration_seconds)
-
-    timer_display_placeholder.metric("Time Remaining", format_time(remaining_time))
-    progress_bar_placeholder.progress(progress)
-
-    quarter_time_threshold = st.session_state.duration_seconds * 0.25
-    if remaining_time <= quarter_time_threshold and not st.session_state.warning_sent:
-        warning_minutes = round(quarter_time_threshold / 60, 1)
-        logger.info(f"Time warning: less than {warning_minutes} minutes remaining")
-        st.warning(f"⏳ Time remaining is less than {warning_minutes} minutes!")
-        st.session_state.warning_sent = True
+    # The countdown reruns on its own every second; the rest of the page only
+    # reruns on user input or when the time is up
+    with timer_display_placeholder.container():
+        render_timer()
 
-    if remaining_time <= 0:
-        logger.info("Time's up for chat session")
-        st.session_state.timer_running = False
-        st.session_state.time_up = True
-        timer_display_placeholder.metric("Time Remaining", "00:00")
-        progress_bar_placeholder.progress(1.0)
+    if time.time() - st.session_state.start_time >= st.session_state.duration_seconds:
+        end_chat_session()
         final_message_placeholder.success("⏰ Time's up! Chat session ended.")
 
     # Only show the chat interface if the time isn't up
@@ -363,9 +435,17 @@ if st.session_state.timer_running:
 
             if st.session_state.timer_running and st.session_state.langchain_chat:
                 if audio_prompt := st.audio_input("Audio Input"):
-                    if audio_prompt.getvalue() != st.session_state.last_audio:
-                        prompt = audio_to_text(audio_prompt.getvalue())
-                        if prompt != st.session_state.last_text:
+                    # Only the digest of the last clip is kept in the session
+                    digest = audio_digest(audio_prompt.getvalue())
+                    if digest != st.session_state.last_audio_digest:
+                        try:
+                            prompt = audio_to_text(audio_prompt.getvalue(), digest)
+                        except EmptyAudioError:
+                            # Nothing was said, skip the ASR and workflow calls
+                            st.warning("沒有偵測到語音，請再錄一次。")
+                            st.session_state.last_audio_digest = digest
+                            prompt = None
+                        if prompt is not None and prompt != st.session_state.last_text:
                             st.session_state.last_text = prompt
                             st.session_state.messages.append(
                                 {"role": "user", "content": prompt}
@@ -374,27 +454,23 @@ if st.session_state.timer_running:
                                 st.session_state.messages
                             )
                             try:
-                                logger.debug("Invoking LangChain workflow")
-
-                                initial_state = {
-                                    "messages": lc_messages,
-                                    "max_generation": 2,
-                                    "docs": [],
-                                    "is_retrieval_related": False,
-                                    "validated_docs": [],
-                                    "response": "",
-                                    "response_validated": None,
-                                    "max_generation": 2,
-                                    "query_rewritten": False,
-                                    "rewritten_query": "",
-                                }
-
-                                response = (
-                                    st.session_state.langchain_chat.workflow.invoke(
-                                        initial_state
+                                if use_workers():
+                                    assistant_response = submit_chat_turn()
+                                else:
+                                    logger.debug("Invoking LangChain workflow")
+
+                                    initial_state = (
+                                        SelfRAGWorkflow.create_initial_state(
+                                            lc_messages
+                                        )
                                     )
-                                )
-                                assistant_response = response["messages"][-1].content
+
+                                    response = (
+                                        st.session_state.langchain_chat.workflow.invoke(
+                                            initial_state
+                                        )
+                                    )
+                                    assistant_response = response["messages"][-1].content
                             except Exception as e:
                                 logger.error(
                                     f"Error generating response: {str(e)}",
@@ -407,7 +483,14 @@ if st.session_state.timer_running:
                             st.session_state.messages.append(
                                 {"role": "assistant", "content": assistant_response}
                             )
-                            st.session_state.last_audio = audio_prompt.getvalue()
+                            # Assess the turn in the background for the final feedback
+                            # (workers evaluate the whole transcript at time-up instead)
+                            if st.session_state.supervisor_agent and not use_workers():
+                                st.session_state.supervisor_agent.observe_turn(
+                                    prompt, assistant_response
+                                )
+                            st.session_state.last_audio_digest = digest
+                            persist_session()
                             st.rerun()
 
     # Sidebar content - always show certain elements
@@ -437,10 +520,6 @@ if st.session_state.timer_running:
             logger.info("User clicked Reset Session button")
             reset_app()
 
-        if st.session_state.timer_running:
-            time.sleep(1)
-            st.rerun()
-
 else:
     # Only show this sidebar content when timer is not running
     with st.sidebar:
@@ -462,6 +541,15 @@ else:
             """
         )
 
+        # Refresh whichever lists changed in a single round-trip
+        load_catalogs(
+            [
+                redis_scenario_handler,
+                redis_supervisor_handler,
+                redis_vector_search_handler,
+            ]
+        )
+
         st.session_state.scenarios_key = st.selectbox(
             "情境選擇",
             options=redis_scenario_handler.get_all_keys(),
@@ -489,17 +577,59 @@ if st.session_state.time_up:
 
     final_message_placeholder.success("⏰ Time's up! Chat session ended.")
 
+    # Archive the transcript once so it can be re-scored offline later
+    if st.session_state.chat_session_id and not st.session_state.transcript_saved:
+        try:
+            transcript_store.save(
+                st.session_state.chat_session_id,
+                st.session_state.messages,
+                scenarios_key=st.session_state.session_scenarios_key,
+                supervisor_key=st.session_state.session_supervisor_key,
+            )
+            st.session_state.transcript_saved = True
+        except Exception as e:
+            logger.error(f"Failed to archive transcript: {str(e)}", exc_info=True)
+
     if st.session_state.supervisor_agent:
-        supervisor_initial_state = {
-            "chat_history": convert_to_langchain_messages(st.session_state.messages),
-            "feedback": "",
-        }
-        supervisor_response = st.session_state.supervisor_agent.workflow.invoke(
-            supervisor_initial_state
+        # Feedback is memoised per transcript so reruns don't call the LLM again
+        digest = transcript_digest(
+            st.session_state.messages,
+            st.session_state.session_scenarios_key,
+            st.session_state.supervisor_instructions,
         )
-        feedback = supervisor_response["feedback"]
+        feedback = st.session_state.feedback_cache.get(digest) or feedback_store.get(
+            digest
+        )
+        if feedback is None:
+            with st.spinner("產生回饋中..."):
+                if use_workers():
+                    supervisor_response = submit_evaluation(digest)
+                else:
+                    supervisor_initial_state = {
+                        "chat_history": convert_to_langchain_messages(
+                            st.session_state.messages
+                        ),
+                        "feedback": "",
+                    }
+                    supervisor_response = (
+                        st.session_state.supervisor_agent.workflow.invoke(
+                            supervisor_initial_state
+                        )
+                    )
+            feedback = supervisor_response["feedback"]
+            feedback_store.set(digest, feedback)
+        st.session_state.feedback_cache[digest] = feedback
         st.text_area("對話回饋", value=feedback.strip(), height=600, disabled=True)
 
+        if st.button("重新產生回饋"):
+            logger.info("User requested regenerating the supervisor feedback")
+            st.session_state.feedback_cache.pop(digest, None)
+            feedback_store.delete(digest)
+            if use_workers():
+                get_job_queue().forget(f"evaluate:{digest}")
+            persist_session()
+            st.rerun()
+
     expandar = st.expander("對話歷史紀錄", expanded=False)
     with expandar:
         display_messages = [
@@ -518,3 +648,6 @@ if st.session_state.time_up:
     if st.button("重置按鈕", type="primary"):
         logger.info("User clicked Reset Session button")
         reset_app()
+
+# Keep the session resumable on any replica
+persist_session()
@@ -1,7 +1,7 @@
+from src.utils.catalog import get_catalog
 from src.utils.redis_handler import RedisHandler
 import streamlit as st
 import os
-import redis
 import sys
 
 # Add the project root to the path to import from apps.backend
@@ -14,27 +14,12 @@ from apps.src.tools.vector_store import (
 st.set_page_config(page_title="PDF RAG System", page_icon="📚", layout="wide")
 
 
-@st.cache_resource
-def get_redis_vector_search_connection():
-    try:
-        r = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=6379,
-            db=1,
-            decode_responses=True,  # Automatically decode response bytes to strings
-        )
-        return r
-    except Exception as e:
-        st.error(f"Failed to connect to Redis: {e}")
-        return None
-
-
 def main():
     st.title("📚 知識庫管理系統")
     st.write("上傳 PDF 文件並使用查詢系統進行查詢。")
 
     # redis handler
-    redis_handler = RedisHandler(redis_connection=get_redis_vector_search_connection())
+    redis_handler = get_catalog("knowledge_bases")
     # Create tabs for different functionalities
     tab1, tab2 = st.tabs(["建立向量資料庫", "向量查詢系統"])
 
@@ -1,26 +1,8 @@
-import os
-from src.utils.redis_handler import RedisHandler
+from src.utils.catalog import get_catalog
 import streamlit as st
-import redis
-
-
-# Initialize Redis connection
-@st.cache_resource
-def get_redis_supervisor_connection():
-    try:
-        r = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=6379,
-            db=2,
-            decode_responses=True,  # Automatically decode response bytes to strings
-        )
-        return r
-    except Exception as e:
-        st.error(f"Failed to connect to Redis: {e}")
-        return None
-
-
-redis_handler = RedisHandler(get_redis_supervisor_connection())
+
+
+redis_handler = get_catalog("supervisor")
 
 
 def main():
@@ -35,6 +35,7 @@ if __name__ == "__main__":
         "docs": [],
         "is_retrieval_related": False,
         "validated_docs": [],
+        "compressed_docs": [],
         "response": "",
         "response_validated": None,
         "query_rewritten": False,
@@ -0,0 +1,248 @@
+"""
+Batch offline evaluation of stored chat transcripts with the SupervisorAgent.
+
+Transcripts are read from a JSONL/JSON file ({"id", "messages": [{"role",
+"content"}], optional "scenarios_key"/"supervisor_key"}) or from the
+transcripts archived in Redis at the end of each chat session. They are
+evaluated by a bounded worker pool under a rate limit, and every result is
+appended to a JSONL output file as soon as it is ready. Re-running with the
+same output file skips the transcripts already evaluated, so an interrupted
+run resumes where it stopped.
+
+Run from the apps directory, e.g.:
+    python -m scripts.batch_evaluate --redis --supervisor-key 新版回饋 \
+        --output rescored.jsonl --workers 8 --rate 2
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from src.agents.supervisor_agent import SupervisorAgent
+from src.utils.log_handler import setup_logger
+from src.utils.data_access import get_handler, get_redis
+from src.utils.transcript_store import TranscriptStore
+
+
+logger = setup_logger(__name__)
+
+
+def convert_to_langchain_messages(messages: List[Dict]) -> List[BaseMessage]:
+    """Convert the session state messages to langchain message objects"""
+    lc_messages = []
+    for message in messages:
+        if message["role"] == "user":
+            lc_messages.append(HumanMessage(content=message["content"]))
+        elif message["role"] == "assistant":
+            lc_messages.append(AIMessage(content=message["content"]))
+    return lc_messages
+
+
+class RateLimiter:
+    """Allow at most `rate` calls per second across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def read_file_transcripts(path: str) -> Iterator[Dict]:
+    """Read transcripts from a JSON list or a JSONL file."""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        yield from json.loads(content)
+        return
+    for line in content.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_completed_ids(path: str) -> set:
+    """Ids already evaluated in a previous run of the same output file."""
+    if not os.path.exists(path):
+        return set()
+    completed = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                completed.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                # A partially written last line from an interrupted run
+                continue
+    return completed
+
+
+class BatchEvaluator:
+    """Evaluate transcripts, sharing one SupervisorAgent per scenario and instructions."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rate_limiter = RateLimiter(args.rate)
+        self.scenario_handler = get_handler("scenarios")
+        self.supervisor_handler = get_handler("supervisor")
+        self._agents = {}
+        self._lock = threading.Lock()
+
+        self.scenario_override = self._read_optional_file(args.scenario_file)
+        self.instructions_override = self._read_optional_file(args.instructions_file)
+
+    @staticmethod
+    def _read_optional_file(path):
+        if not path:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _get_agent(self, scenarios_key: str, supervisor_key: str) -> SupervisorAgent:
+        scenarios_description = self.scenario_override
+        if scenarios_description is None and scenarios_key:
+            scenarios_description = self.scenario_handler.get_value(scenarios_key)
+        instructions = self.instructions_override
+        if instructions is None and supervisor_key:
+            instructions = self.supervisor_handler.get_value(supervisor_key)
+
+        cache_key = (scenarios_description, instructions)
+        with self._lock:
+            if cache_key not in self._agents:
+                # Stored transcripts are evaluated in one call, not turn by turn
+                self._agents[cache_key] = SupervisorAgent(
+                    scenarios_description=scenarios_description,
+                    supervisor_instructions=instructions,
+                    incremental=False,
+                )
+            return self._agents[cache_key]
+
+    def evaluate(self, transcript: Dict) -> Dict:
+        scenarios_key = self.args.scenario_key or transcript.get("scenarios_key")
+        supervisor_key = self.args.supervisor_key or transcript.get("supervisor_key")
+        agent = self._get_agent(scenarios_key, supervisor_key)
+
+        last_error = None
+        for attempt in range(self.args.retries + 1):
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = agent.workflow.invoke(
+                    {
+                        "chat_history": convert_to_langchain_messages(
+                            transcript["messages"]
+                        ),
+                        "feedback": "",
+                    }
+                )
+                return {
+                    "id": transcript["id"],
+                    "scenarios_key": scenarios_key,
+                    "supervisor_key": supervisor_key,
+                    "feedback": response["feedback"].strip(),
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "evaluated_at": time.time(),
+                }
+            except Exception as e:
+                last_error = e
+                logger.warning(
+                    "Evaluation of %s failed (attempt %s): %s",
+                    transcript["id"],
+                    attempt + 1,
+                    e,
+                )
+                if attempt < self.args.retries:
+                    time.sleep(min(30, 2**attempt))
+        raise last_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="JSONL or JSON file with transcripts")
+    source.add_argument(
+        "--redis",
+        action="store_true",
+        help="Read the transcripts archived in Redis",
+    )
+    parser.add_argument(
+        "--pattern", default="*", help="Session id pattern of the Redis transcripts"
+    )
+    parser.add_argument("--output", required=True, help="JSONL file to append to")
+    parser.add_argument("--scenario-key", help="Scenario to use for every transcript")
+    parser.add_argument("--scenario-file", help="Scenario description from a file")
+    parser.add_argument(
+        "--supervisor-key", help="Supervisor instructions to use for every transcript"
+    )
+    parser.add_argument(
+        "--instructions-file", help="Supervisor instructions from a file"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="Evaluations started per second"
+    )
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--limit", type=int, help="Evaluate at most this many")
+    args = parser.parse_args()
+
+    if args.redis:
+        store = TranscriptStore(get_redis())
+        transcripts = store.iter_transcripts(args.pattern)
+    else:
+        transcripts = read_file_transcripts(args.input)
+
+    completed = read_completed_ids(args.output)
+    pending = [t for t in transcripts if t["id"] not in completed]
+    if args.limit:
+        pending = pending[: args.limit]
+    print(
+        f"{len(completed)} transcripts already evaluated, {len(pending)} to go",
+        file=sys.stderr,
+    )
+
+    evaluator = BatchEvaluator(args)
+    done = failed = 0
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as output, ThreadPoolExecutor(
+        max_workers=args.workers
+    ) as executor:
+        futures = {executor.submit(evaluator.evaluate, t): t["id"] for t in pending}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error("Giving up on %s: %s", futures[future], e)
+                continue
+            # Written and flushed one by one so that progress survives a crash
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            done += 1
+            print(
+                f"[{done + failed}/{len(pending)}] {result['id']} "
+                f"({result['seconds']:.1f} s)",
+                file=sys.stderr,
+            )
+
+    print(
+        f"Evaluated {done}, failed {failed} in {time.perf_counter() - start:.1f} s",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Offline latency benchmark of the SelfRAGWorkflow.
+
+Runs chat turns through every branch of the workflow against the fake
+Gemini backend (no network, no quota) and reports per-node and per-turn
+timings, the simulated model latency, the orchestration overhead and the
+number of LLM calls per turn.
+
+Run from the apps directory:
+    python -m scripts.benchmark_workflow --turns 20 --chat-latency lognormal:0.4:0.3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.messages import HumanMessage
+
+from src.tools.fake_models import FakeBackend, FakeEmbeddings, parse_latency
+from src.utils.metrics import LLM_CALLS, STAGE_LATENCY, registry
+from src.utils.redis_handler import RedisHandler
+
+
+SCENARIOS = {
+    "direct_answer": {"agent_action": "respond"},
+    "answered": {
+        "agent_action": "retrieve",
+        "document_verdicts": ("true",),
+        "response_verdicts": ("true",),
+    },
+    "docs_rejected": {
+        "agent_action": "retrieve",
+        "document_verdicts": ("false",),
+        "response_verdicts": ("true",),
+    },
+    "validation_failure": {
+        "agent_action": "retrieve",
+        "document_verdicts": ("true",),
+        "response_verdicts": ("false",),
+    },
+}
+
+FIXTURE_DOCUMENTS = [
+    "登入平台後，請點選右上角的設定。密碼需要每九十天更新一次。",
+    "若忘記密碼，請聯絡管理員重設。系統維護時間為每週日凌晨兩點到四點。",
+    "報表可以匯出為 CSV 或 PDF 格式。匯出按鈕位於報表頁面的右上方。",
+    "新進人員需要完成三堂線上課程，才能開通正式帳號。",
+]
+FIXTURE_KEY = "benchmark"
+
+
+def build_fixture_index(directory: str):
+    """Create a small FAISS index with the fake embeddings and select it."""
+    vector_store = FAISS.from_texts(FIXTURE_DOCUMENTS, FakeEmbeddings())
+    vector_store.save_local(os.path.join(directory, FIXTURE_KEY))
+    os.environ["VECTORSTORE_PATH"] = directory
+    RedisHandler.set_current_key(FIXTURE_KEY)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def run_scenario(name: str, script: dict, turns: int, seed: int) -> dict:
+    """Run `turns` chat turns of one scenario in a single session."""
+    # Imported lazily so that the environment is configured first
+    from src.agents.rag_agent import SelfRAGWorkflow
+
+    FakeBackend.configure(seed=seed, **script)
+    registry.reset()
+    workflow = SelfRAGWorkflow(session_id=f"benchmark-{name}")
+
+    turn_seconds, simulated_seconds = [], []
+    for turn in range(turns):
+        messages = [HumanMessage(content=f"如何重設密碼？（第 {turn + 1} 次）")]
+        FakeBackend.reset_simulated_seconds()
+        start = time.perf_counter()
+        workflow.workflow.invoke(SelfRAGWorkflow.create_initial_state(messages))
+        turn_seconds.append(time.perf_counter() - start)
+        simulated_seconds.append(FakeBackend.simulated_seconds())
+
+    overhead = [t - s for t, s in zip(turn_seconds, simulated_seconds)]
+    return {
+        "turns": turns,
+        "turn": {
+            "mean": statistics.mean(turn_seconds),
+            "p50": percentile(turn_seconds, 0.5),
+            "p95": percentile(turn_seconds, 0.95),
+            "p99": percentile(turn_seconds, 0.99),
+        },
+        "simulated_mean": statistics.mean(simulated_seconds),
+        "overhead_mean": statistics.mean(overhead),
+        "llm_calls_per_turn": sum(registry.counters(LLM_CALLS).values()) / turns,
+        "llm_calls": registry.counters(LLM_CALLS),
+        "nodes": registry.summary(STAGE_LATENCY),
+    }
+
+
+def print_report(results: dict):
+    for name, result in results.items():
+        turn = result["turn"]
+        print(f"\n=== {name} ({result['turns']} turns)")
+        print(
+            f"turn       mean {turn['mean'] * 1000:8.1f} ms  p50 {turn['p50'] * 1000:8.1f} ms"
+            f"  p95 {turn['p95'] * 1000:8.1f} ms  p99 {turn['p99'] * 1000:8.1f} ms"
+        )
+        print(
+            f"simulated  mean {result['simulated_mean'] * 1000:8.1f} ms"
+            f"  overhead mean {result['overhead_mean'] * 1000:8.1f} ms"
+            f"  llm calls/turn {result['llm_calls_per_turn']:.1f}"
+        )
+        for stage, stats in sorted(result["nodes"].items()):
+            print(
+                f"  {stage:<32} n={stats['count']:<4} p50 {stats['p50'] * 1000:8.1f} ms"
+                f"  p95 {stats['p95'] * 1000:8.1f} ms  p99 {stats['p99'] * 1000:8.1f} ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument(
+        "--scenario",
+        choices=sorted(SCENARIOS),
+        action="append",
+        help="Scenario to run, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--chat-latency",
+        default="0",
+        help='Chat model latency, e.g. "0.3", "uniform:0.2:0.6" or "lognormal:0.4:0.3"',
+    )
+    parser.add_argument("--embedding-latency", default="0")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--llm-cache",
+        action="store_true",
+        help="Enable the LLM response cache (disabled by default to measure raw calls)",
+    )
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["CHAT_MEMORY_BACKEND"] = "memory"
+    os.environ["LLM_CACHE_ENABLED"] = "true" if args.llm_cache else "false"
+    os.environ["LLM_CACHE_REDIS"] = "false"
+    FakeBackend.latencies = {
+        "chat": parse_latency(args.chat_latency),
+        "embedding": parse_latency(args.embedding_latency),
+    }
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        build_fixture_index(directory)
+        os.environ["LLM_CACHE_PATH"] = os.path.join(directory, "llm_cache.sqlite3")
+        for name in args.scenario or SCENARIOS:
+            results[name] = run_scenario(name, SCENARIOS[name], args.turns, args.seed)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
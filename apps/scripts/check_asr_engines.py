@@ -0,0 +1,55 @@
+"""
+Check that every ASR engine supports both `transcribe` and `transcribe_stream`.
+
+Every engine in `ENGINES`, and `HedgedASR`, must be a concrete `ASREngine`.
+The fake engine and a hedged pair of fake engines are also run through both
+methods on the fake backend. Exits non-zero on the first failure.
+
+Run from the apps directory:
+    python -m scripts.check_asr_engines
+"""
+
+import inspect
+import os
+import sys
+
+os.environ["LLM_BACKEND"] = "fake"
+
+from src.services.asr import ENGINES, ASREngine, FakeASR, HedgedASR  # noqa: E402
+from src.tools.audio_processing import encode_wav  # noqa: E402
+
+
+def check_classes():
+    for name, engine_class in list(ENGINES.items()) + [("hedged", HedgedASR)]:
+        assert issubclass(engine_class, ASREngine), f"{name} is not an ASREngine"
+        assert not inspect.isabstract(engine_class), (
+            f"{name} does not implement "
+            f"{', '.join(sorted(engine_class.__abstractmethods__))}"
+        )
+
+
+def check_calls(audio: bytes):
+    for engine in (FakeASR(), HedgedASR(FakeASR(), FakeASR(), initial_delay=0)):
+        text = engine.transcribe(audio)
+        streamed = list(engine.transcribe_stream(audio))
+        assert text, f"{engine.name} returned no transcript"
+        assert streamed and streamed[-1] == text, (
+            f"{engine.name} streamed {streamed!r} instead of ending with {text!r}"
+        )
+
+
+def main():
+    import numpy as np
+
+    audio = encode_wav(np.zeros(1600, dtype=np.float32), 16000)
+    try:
+        check_classes()
+        check_calls(audio)
+    except AssertionError as e:
+        print(f"FAILED: {e}", file=sys.stderr)
+        sys.exit(1)
+    print("All ASR engines support transcribe and transcribe_stream")
+
+
+if __name__ == "__main__":
+    main()
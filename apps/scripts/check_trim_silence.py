@@ -0,0 +1,67 @@
+"""
+Check that `trim_silence` handles continuous speech and short clips.
+
+Tones of a few frames to several seconds, with and without silence around
+them, are trimmed with and without `max_pause`; the trimmed audio must keep
+the tone. Exits non-zero on the first failure.
+
+Run from the apps directory:
+    python -m scripts.check_trim_silence
+"""
+
+import sys
+
+import numpy as np
+
+from src.tools.audio_processing import detect_speech, trim_silence
+
+
+RATE = 16000
+
+
+def tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.3 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def check_mask_length():
+    for seconds in (0.05, 0.1, 0.3, 5):
+        samples = tone(seconds)
+        speech, frame = detect_speech(samples, RATE)
+        assert len(speech) == len(samples) // frame, (
+            f"{seconds} s clip: {len(speech)} mask frames for "
+            f"{len(samples) // frame} audio frames"
+        )
+
+
+def check_trim():
+    clips = {f"{seconds} s tone": tone(seconds) for seconds in (0.05, 0.1, 0.3, 5)}
+    clips["tone with pauses"] = np.concatenate(
+        [silence(1), tone(1), silence(2), tone(1), silence(1)]
+    )
+    for name, samples in clips.items():
+        for max_pause in (None, 0.5):
+            trimmed, removed = trim_silence(samples, RATE, max_pause)
+            assert len(trimmed) > 0, f"{name}: everything trimmed"
+            assert removed < len(samples) / RATE, f"{name}: removed {removed} s"
+    kept, _ = trim_silence(clips["tone with pauses"], RATE)
+    shortened, _ = trim_silence(clips["tone with pauses"], RATE, 0.5)
+    assert len(kept) - len(shortened) > RATE, "the long pause was not shortened"
+
+
+def main():
+    try:
+        check_mask_length()
+        check_trim()
+    except AssertionError as e:
+        print(f"FAILED: {e}", file=sys.stderr)
+        sys.exit(1)
+    print("trim_silence handles continuous speech and short clips")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Local stand-in for the Bronci ASR API.
+
+Implements the endpoints used by `BronciWrapper` (login, subtitle tasks,
+subtitle link, download, delete) with a configurable processing time and
+token lifetime, and counts logins, requests and TCP connections so that
+connection reuse and token refresh can be checked without the real service.
+
+Run from the apps directory and point the client at it:
+    python -m scripts.fake_asr_server --port 8765 --processing 1.5
+    BRONCI_API_URL=http://127.0.0.1:8765 streamlit run main.py
+
+or start it in-process with `FakeASRServer().start()`.
+"""
+
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeASRServer:
+    """Threaded HTTP server emulating the Bronci subtitle task API."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        processing_seconds: float = 0.5,
+        token_ttl: float = 3600,
+        transcript: str = "這是一段測試語音。",
+    ):
+        self.processing_seconds = processing_seconds
+        self.token_ttl = token_ttl
+        self.transcript = transcript
+        self.tasks = {}
+        self.tokens = {}
+        self.stats = {"logins": 0, "requests": 0, "connections": 0, "unauthorized": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeASRServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def expire_tokens(self):
+        """Invalidate every issued token, as if they had all timed out."""
+        with self._lock:
+            self.tokens.clear()
+
+    def issue_token(self) -> str:
+        with self._lock:
+            self.stats["logins"] += 1
+            token = f"token-{next(self._ids)}"
+            self.tokens[token] = time.monotonic() + self.token_ttl
+        return token
+
+    def is_valid(self, token: str) -> bool:
+        with self._lock:
+            expiry = self.tokens.get(token)
+        return expiry is not None and expiry > time.monotonic()
+
+    def create_task(self, size: int) -> int:
+        with self._lock:
+            task_id = next(self._ids)
+            self.tasks[task_id] = {
+                "ready_at": time.monotonic() + self.processing_seconds,
+                "size": size,
+            }
+        return task_id
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+    fake: FakeASRServer = None
+
+    def setup(self):
+        super().setup()
+        with self.fake._lock:
+            self.fake.stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, content_type="application/json"):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _authorised(self, token: str = None) -> bool:
+        if token is None:
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if self.fake.is_valid(token):
+            return True
+        with self.fake._lock:
+            self.fake.stats["unauthorized"] += 1
+        self._send(401, {"code": 401, "error": "invalid token"})
+        return False
+
+    def _route(self, method: str):
+        with self.fake._lock:
+            self.fake.stats["requests"] += 1
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        path = parsed.path
+
+        if method == "POST" and path == "/api/v1/login":
+            self._read_body()
+            return self._send(200, {"token": self.fake.issue_token()})
+
+        match = re.fullmatch(r"/files/(\d+)\.dia", path)
+        if method == "GET" and match:
+            if not self._authorised(query.get("token", [""])[0]):
+                return
+            return self._send(200, self.fake.transcript, "text/plain; charset=utf-8")
+
+        if method == "POST" and path == "/api/v1/subtitle/tasks":
+            body = self._read_body()
+            if not self._authorised():
+                return
+            task_id = self.fake.create_task(len(body))
+            return self._send(200, {"code": 200, "id": task_id})
+
+        match = re.fullmatch(r"/api/v1/subtitle/tasks/(\d+)(/subtitle-link)?", path)
+        if not match:
+            return self._send(404, {"code": 404, "error": "not found"})
+        if not self._authorised():
+            return
+        task = self.fake.tasks.get(int(match.group(1)))
+        if task is None:
+            return self._send(200, {"code": 404, "error": "task not found"})
+
+        if method == "DELETE":
+            self.fake.tasks.pop(int(match.group(1)), None)
+            return self._send(200, {"code": 200})
+        if match.group(2):
+            url = f"{self.fake.url}/files/{match.group(1)}.dia"
+            return self._send(200, {"code": 200, "data": [{"url": url}]})
+        status = 3 if time.monotonic() >= task["ready_at"] else 1
+        return self._send(200, {"code": 200, "data": [{"status": status}]})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--processing", type=float, default=0.5, help="Seconds until a task is done"
+    )
+    parser.add_argument(
+        "--token-ttl", type=float, default=3600, help="Token lifetime in seconds"
+    )
+    args = parser.parse_args()
+
+    server = FakeASRServer(args.host, args.port, args.processing, args.token_ttl)
+    print(f"Fake ASR server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
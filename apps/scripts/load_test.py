@@ -0,0 +1,266 @@
+"""
+Concurrent multi-session load test of the chat path.
+
+Each simulated trainee session follows what `page/chatbot_app.py` does:
+start a SelfRAGWorkflow and a SupervisorAgent, run voice turns (speech to
+text, then a workflow turn over the whole message history) and evaluate the
+transcript with the supervisor at time-up. LLM, embedding and ASR calls go to
+the fake backend with injectable latency and error rates.
+
+The report covers throughput, latency percentiles, CPU utilisation, thread
+count and memory per session.
+
+Run from the apps directory:
+    python -m scripts.load_test --sessions 20 --turns 5 --chat-latency lognormal:0.5:0.4
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from scripts.benchmark_workflow import build_fixture_index, percentile
+from src.tools.fake_models import FakeBackend, FakeTranscriber, parse_latency
+from src.utils.metrics import LLM_CALLS, STAGE_LATENCY, registry
+
+
+def latency_stats(values) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": statistics.mean(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (Linux), falling back to the peak."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class ResourceMonitor:
+    """Sample thread count and memory in the background while the test runs."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_threads = threading.active_count()
+        self.peak_rss = current_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self.peak_rss = max(self.peak_rss, current_rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_session(index: int, turns: int, transcriber, results: dict, lock):
+    """Run one simulated session and append its timings to `results`."""
+    from src.agents.rag_agent import SelfRAGWorkflow
+    from src.agents.supervisor_agent import SupervisorAgent
+
+    session = {"turns": [], "asr": [], "errors": 0, "supervisor": None}
+    start = time.perf_counter()
+    workflow = SelfRAGWorkflow(
+        session_id=f"load-{index}", scenarios_description="平台手冊"
+    )
+    supervisor = SupervisorAgent(
+        scenarios_description="平台手冊", supervisor_instructions="請給予回饋"
+    )
+    setup_seconds = time.perf_counter() - start
+
+    messages = []
+    for _ in range(turns):
+        turn_start = time.perf_counter()
+        try:
+            prompt = transcriber(b"\0" * 32000)
+        except Exception:
+            # Nothing was said, so there is no turn to answer or evaluate
+            session["errors"] += 1
+            continue
+        session["asr"].append(time.perf_counter() - turn_start)
+        messages.append(HumanMessage(content=prompt))
+        try:
+            state = workflow.workflow.invoke(
+                SelfRAGWorkflow.create_initial_state(messages)
+            )
+            answer = state["messages"][-1].content
+        except Exception as e:
+            session["errors"] += 1
+            answer = f"Sorry, I couldn't generate a response due to {e}"
+        messages.append(AIMessage(content=answer))
+        supervisor.observe_turn(prompt, answer)
+        session["turns"].append(time.perf_counter() - turn_start)
+
+    supervisor_start = time.perf_counter()
+    try:
+        supervisor.workflow.invoke({"chat_history": messages, "feedback": ""})
+        session["supervisor"] = time.perf_counter() - supervisor_start
+    except Exception:
+        session["errors"] += 1
+
+    session["setup"] = setup_seconds
+    with lock:
+        results.append(session)
+
+
+def run_load_test(sessions: int, turns: int, concurrency: int) -> dict:
+    registry.reset()
+    transcriber = FakeTranscriber()
+    results, lock = [], threading.Lock()
+
+    baseline_rss = current_rss_bytes()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with ResourceMonitor() as monitor:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(run_session, i, turns, transcriber, results, lock)
+                for i in range(sessions)
+            ]
+            for future in futures:
+                future.result()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    turn_latencies = [t for s in results for t in s["turns"]]
+    total_turns = len(turn_latencies)
+    return {
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "concurrency": concurrency,
+        "wall_seconds": wall,
+        "throughput": {
+            "turns_per_second": total_turns / wall,
+            "sessions_per_minute": sessions / wall * 60,
+        },
+        "latency": {
+            "turn": latency_stats(turn_latencies),
+            "asr": latency_stats([t for s in results for t in s["asr"]]),
+            "session_setup": latency_stats([s["setup"] for s in results]),
+            "supervisor": latency_stats(
+                [s["supervisor"] for s in results if s["supervisor"] is not None]
+            ),
+        },
+        "errors": sum(s["errors"] for s in results),
+        "cpu": {
+            "cpu_seconds": cpu,
+            "utilisation_cores": cpu / wall,
+            "cpu_ms_per_turn": cpu / max(total_turns, 1) * 1000,
+        },
+        "threads_peak": monitor.peak_threads,
+        "memory": {
+            "baseline_mb": baseline_rss / 2**20,
+            "peak_mb": monitor.peak_rss / 2**20,
+            "per_session_mb": (monitor.peak_rss - baseline_rss) / sessions / 2**20,
+        },
+        "llm_calls": sum(registry.counters(LLM_CALLS).values()),
+        "stages": registry.summary(STAGE_LATENCY),
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"\n{report['sessions']} sessions x {report['turns_per_session']} turns, "
+        f"concurrency {report['concurrency']}, {report['wall_seconds']:.1f} s wall"
+    )
+    throughput = report["throughput"]
+    print(
+        f"throughput    {throughput['turns_per_second']:.2f} turns/s, "
+        f"{throughput['sessions_per_minute']:.1f} sessions/min, "
+        f"{report['errors']} errors, {report['llm_calls']:.0f} LLM calls"
+    )
+    for name, stats in report["latency"].items():
+        if stats["count"]:
+            print(
+                f"{name:<14}n={stats['count']:<5} p50 {stats['p50'] * 1000:8.1f} ms"
+                f"  p95 {stats['p95'] * 1000:8.1f} ms  p99 {stats['p99'] * 1000:8.1f} ms"
+                f"  max {stats['max'] * 1000:8.1f} ms"
+            )
+    cpu = report["cpu"]
+    memory = report["memory"]
+    print(
+        f"cpu           {cpu['utilisation_cores']:.2f} cores, "
+        f"{cpu['cpu_ms_per_turn']:.1f} ms CPU per turn, peak threads {report['threads_peak']}"
+    )
+    print(
+        f"memory        baseline {memory['baseline_mb']:.1f} MB, peak {memory['peak_mb']:.1f} MB, "
+        f"{memory['per_session_mb']:.2f} MB per session"
+    )
+    print("stages (contention shows up as p95/p99 far above p50):")
+    for stage, stats in sorted(report["stages"].items()):
+        print(
+            f"  {stage:<32} n={stats['count']:<5} p50 {stats['p50'] * 1000:8.1f} ms"
+            f"  p95 {stats['p95'] * 1000:8.1f} ms  p99 {stats['p99'] * 1000:8.1f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Sessions running at once (default: all of them)",
+    )
+    parser.add_argument("--chat-latency", default="lognormal:0.5:0.4")
+    parser.add_argument("--embedding-latency", default="0.05")
+    parser.add_argument("--asr-latency", default="lognormal:1.5:0.3")
+    parser.add_argument("--chat-error-rate", type=float, default=0.0)
+    parser.add_argument("--asr-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["CHAT_MEMORY_BACKEND"] = "memory"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    FakeBackend.configure(
+        seed=args.seed,
+        latencies={
+            "chat": parse_latency(args.chat_latency),
+            "embedding": parse_latency(args.embedding_latency),
+            "asr": parse_latency(args.asr_latency),
+        },
+        error_rates={"chat": args.chat_error_rate, "asr": args.asr_error_rate},
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Every session shares the class-level RedisHandler key, as in the app
+        build_fixture_index(directory)
+        report = run_load_test(
+            args.sessions, args.turns, args.concurrency or args.sessions
+        )
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Move the data of the former per-feature Redis databases into the single,
+key-prefixed database used by `src.utils.data_access`.
+
+Scenarios (db 0), knowledge bases (db 1) and supervisor instructions (db 2)
+get their namespace prefix; chat memory, feedback, transcripts, jobs and
+sessions (db 3 to 7) already prefix their keys and are copied as they are.
+Keys are copied with COPY, which keeps their type, TTL and, for the job
+stream, its consumer group. Existing keys in the target are left alone
+unless --replace is given. The catalog indexes of the target are dropped,
+the app rebuilds them with the copied entries.
+
+Run from the apps directory, e.g.:
+    python -m scripts.migrate_redis_namespaces --dry-run
+    python -m scripts.migrate_redis_namespaces --delete-source
+"""
+
+import argparse
+import os
+
+from src.utils.data_access import NAMESPACES
+from src.utils.redis_handler import create_redis_connection
+
+
+# Former database of each kind of data, with the prefix its keys now take
+LEGACY_DATABASES = {
+    0: NAMESPACES["scenarios"],
+    1: NAMESPACES["knowledge_bases"],
+    2: NAMESPACES["supervisor"],
+    3: "",  # chat memory
+    4: "",  # feedback
+    5: "",  # transcripts
+    6: "",  # jobs
+    7: "",  # sessions
+}
+
+# Keys of the new layout, left alone when migrating the target database itself
+CURRENT_KEYS = tuple(NAMESPACES.values()) + (
+    "catalog:",
+    "chat_memory:",
+    "feedback:",
+    "transcript:",
+    "transcription:",
+    "llm_cache:",
+    "session:",
+    "job:",
+    "jobs",
+)
+
+
+def migrate_database(
+    source_db: int,
+    prefix: str,
+    target_db: int,
+    replace: bool = False,
+    delete_source: bool = False,
+    dry_run: bool = False,
+    batch_size: int = 500,
+) -> dict:
+    """Copy every key of `source_db` to `target_db` under `prefix`."""
+    source = create_redis_connection(source_db)
+    stats = {"copied": 0, "skipped": 0}
+    batch = []
+
+    def flush():
+        pipeline = source.pipeline(transaction=False)
+        for key in batch:
+            pipeline.copy(key, prefix + key, destination_db=target_db, replace=replace)
+        copied = pipeline.execute()
+        if delete_source:
+            done = [key for key, ok in zip(batch, copied) if ok]
+            if done:
+                source.delete(*done)
+        stats["copied"] += sum(1 for ok in copied if ok)
+        stats["skipped"] += sum(1 for ok in copied if not ok)
+        batch.clear()
+
+    # Listed up front, the copies may land in the database being scanned
+    keys = list(source.scan_iter(count=batch_size))
+    for key in keys:
+        # Index sets of the catalogs of the per-database layout
+        if key.startswith("catalog:"):
+            continue
+        if source_db == target_db and key.startswith(CURRENT_KEYS):
+            continue
+        if dry_run:
+            print(f"db {source_db}: {key} -> {prefix + key}")
+            stats["copied"] += 1
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--target-db",
+        type=int,
+        default=int(os.getenv("REDIS_DB", 0)),
+        help="Database the app now uses (REDIS_DB)",
+    )
+    parser.add_argument(
+        "--extra-db",
+        type=int,
+        action="append",
+        default=[],
+        help="Also copy this database as is, e.g. the former LLM or "
+        "transcription cache database",
+    )
+    parser.add_argument("--replace", action="store_true")
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    databases = dict(LEGACY_DATABASES)
+    databases.update({db: "" for db in args.extra_db})
+    for source_db, prefix in sorted(databases.items()):
+        if source_db == args.target_db and not prefix:
+            # Already in place
+            continue
+        stats = migrate_database(
+            source_db,
+            prefix,
+            args.target_db,
+            replace=args.replace,
+            delete_source=args.delete_source,
+            dry_run=args.dry_run,
+        )
+        print(
+            f"db {source_db} -> db {args.target_db} ({prefix or 'no prefix'}): "
+            f"{stats['copied']} copied, {stats['skipped']} already present"
+        )
+    if not args.dry_run:
+        create_redis_connection(args.target_db).delete(
+            *(
+                f"catalog:{namespace}{suffix}"
+                for namespace in NAMESPACES
+                for suffix in ("", ":indexed")
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
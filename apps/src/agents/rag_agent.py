@@ -3,6 +3,8 @@ import uuid
 
 from langchain_core.messages import BaseMessage, AIMessage
 from src.services.llm import RAGLLMService
+from src.tools.compression import compress_documents
+from src.utils.metrics import instrument, record_retry
 from langgraph.graph import StateGraph, END
 
 
@@ -16,6 +18,7 @@ class SelfRAGWorkflow:
         docs: List[str] | str  # Retrieved documents
         is_retrieval_related: bool  # Whether the query is related to retrieval
         validated_docs: List[str]  # Documents that passed validation
+        compressed_docs: List[str]  # Validated documents reduced to the relevant sentences
         response: str = ""  # Generated response
         response_validated: Optional[bool] = None  # Whether response passed validation
         max_generation: int = 2  # Maximum number of retries
@@ -36,10 +39,26 @@ class SelfRAGWorkflow:
 
         self.workflow = self._build_workflow()
 
+    @staticmethod
+    def create_initial_state(messages: Sequence[BaseMessage]) -> "SelfRAGState":
+        """Create the initial workflow state for a chat turn"""
+        return {
+            "messages": list(messages),
+            "docs": [],
+            "is_retrieval_related": False,
+            "validated_docs": [],
+            "compressed_docs": [],
+            "response": "",
+            "response_validated": None,
+            "max_generation": 2,
+            "query_rewritten": False,
+            "rewritten_query": "",
+        }
+
     def _build_workflow(self):
         """Build the LangGraph workflow for the self-RAG agent.
 
-        It should be retrieve_or_respond -> validate_docs(for each document) -> generate_response -> validate_response -> query_rewrite -> generate_final_response.
+        It should be retrieve_or_respond -> validate_docs(for each document) -> compress_docs -> generate_response -> validate_response -> query_rewrite -> generate_final_response.
         If it fails in validate_docs, namely no doc related, it should go back to retrieve_or_respond keep retriving and skip the top_k, max retries twice and if still fails, go to query_rewrite.
         If it fails in validate_response, it should go to query_rewrited.
         """
@@ -49,6 +68,7 @@ class SelfRAGWorkflow:
         # Add nodes
         workflow.add_node("retrieve_or_respond", self.retrieve_or_respond)
         workflow.add_node("validate_docs", self.validate_docs)
+        workflow.add_node("compress_docs", self.compress_docs)
         workflow.add_node("generate_response", self.generate_response)
         workflow.add_node("validate_response", self.validate_response)
         workflow.add_node("query_rewrite", self.query_rewrite)
@@ -61,6 +81,7 @@ class SelfRAGWorkflow:
         workflow.add_conditional_edges("validate_docs", self.check_validate_docs)
         workflow.add_conditional_edges("validate_response", self.check_max_generation)
 
+        workflow.add_edge("compress_docs", "generate_response")
         workflow.add_edge("generate_response", "validate_response")
         workflow.add_edge("final_response", END)
         # Set entry point
@@ -68,6 +89,7 @@ class SelfRAGWorkflow:
 
         return workflow.compile()
 
+    @instrument("self_rag")
     def retrieve_or_respond(self, state):
         """An agent which decide to retrieve relevant documents based on the query or reply the LLM answer directly"""
         # Extract the query from the latest human message
@@ -90,6 +112,7 @@ class SelfRAGWorkflow:
         else:
             return "final_response"
 
+    @instrument("self_rag")
     def validate_docs(self, state):
         """Validate the retrieved documents is related to the query, keep the related documents and remove the unrelated documents"""
         query = state["messages"][-1].content
@@ -116,18 +139,27 @@ class SelfRAGWorkflow:
         if not state["validated_docs"]:
             return "query_rewrite"
         else:
-            return "generate_response"
+            return "compress_docs"
+
+    @instrument("self_rag")
+    def compress_docs(self, state):
+        """Keep only the sentences of the validated documents most relevant to the query, within the token budget"""
+        query = state["messages"][-1].content
+        state["compressed_docs"] = compress_documents(query, state["validated_docs"])
+        return state
 
+    @instrument("self_rag")
     def generate_response(self, state):
         """Generate a response based on the query and validated retrieved documents"""
         is_response_validated = state.get("response_validated")
         if is_response_validated is not None and is_response_validated == False:
             state["max_generation"] += 1
+            record_retry("self_rag", "regenerate")
 
         query = state["messages"][-1].content
-        validated_docs = state["validated_docs"]
+        validated_docs = state.get("compressed_docs") or state["validated_docs"]
 
-        # Generate response using the validated documents
+        # Generate response using the (compressed) validated documents
         docs_content = "\n\n".join(
             [f"Document {i+1}:\n{doc}" for i, doc in enumerate(validated_docs)]
         )
@@ -142,6 +174,7 @@ class SelfRAGWorkflow:
 
         return state
 
+    @instrument("self_rag")
     def validate_response(self, state):
         """Validate the generated response twice with LLM response and query"""
         query = state["messages"][-1].content
@@ -170,6 +203,7 @@ class SelfRAGWorkflow:
             else:
                 return "generate_response"
 
+    @instrument("self_rag")
     def query_rewrite(self, state: SelfRAGState):
         """Rewrite the query if it failed in the previous stage"""
 
@@ -186,6 +220,7 @@ class SelfRAGWorkflow:
 
         return state
 
+    @instrument("self_rag")
     def final_response(self, state):
         """Generate the final response based on the rewritten query"""
         # Generate final response using the rewritten query
@@ -1,13 +1,30 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, TypedDict
 from src.services.llm import EvalLLMService
-from langchain_core.messages import BaseMessage
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import instrument, track_stage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.prompt_values import ChatPromptValue
 from langgraph.graph import StateGraph, END
 
 
+logger = setup_logger(__name__)
+
+# Background workers running the per-turn assessments of every session
+_assessment_executor = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="supervisor-turns"
+)
+
+
 class SupervisorAgent:
     """
     A supervisor agent which can evaluate the chat history with given scenarios.
+
+    In incremental mode every completed turn is assessed in the background
+    with `observe_turn`, keeping a running summary of the conversation, so
+    that at time-up only a short synthesis call is left to run.
     """
 
     class SupervisorState(TypedDict):
@@ -17,17 +34,36 @@ class SupervisorAgent:
         feedback: str
 
     def __init__(
-        self, scenarios_description: str = None, supervisor_instructions: str = None
+        self,
+        scenarios_description: str = None,
+        supervisor_instructions: str = None,
+        incremental: bool = None,
     ):
         """Initialize the Supervisor agent with Open AI"""
         if not scenarios_description:
             scenarios_description = ""
+        if incremental is None:
+            incremental = os.getenv("SUPERVISOR_INCREMENTAL", "true").lower() in (
+                "1",
+                "true",
+                "yes",
+            )
 
         self.scenarios_description = scenarios_description
+        self.incremental = incremental
         self.llm_service = EvalLLMService(
             scenarios_description=self.scenarios_description,
             supervisor_instructions=supervisor_instructions,
         )
+
+        # Incremental evaluation state
+        self.running_summary = ""
+        self.turn_assessments = []
+        self._pending_turns = []
+        self._futures = []
+        self._lock = threading.Lock()
+        self._assess_lock = threading.Lock()
+
         self.workflow = self._build_workflow()
 
     def _build_workflow(self):
@@ -44,8 +80,79 @@ class SupervisorAgent:
 
         return workflow.compile()
 
+    def observe_turn(self, user_message: str, assistant_message: str):
+        """Queue a completed turn for assessment in the background."""
+        if not self.incremental:
+            return
+        with self._lock:
+            self._pending_turns.append(
+                [HumanMessage(content=user_message), AIMessage(content=assistant_message)]
+            )
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(_assessment_executor.submit(self._assess_pending))
+
+    def export_state(self) -> dict:
+        """The incremental evaluation state, serialisable as JSON."""
+        with self._lock:
+            return {
+                "running_summary": self.running_summary,
+                "turn_assessments": list(self.turn_assessments),
+                "pending_turns": [
+                    [user.content, assistant.content]
+                    for user, assistant in self._pending_turns
+                ],
+            }
+
+    def restore_state(self, state: dict):
+        """Resume from `export_state`, e.g. in another process, and assess
+        the turns that were still pending."""
+        with self._lock:
+            self.running_summary = state.get("running_summary", "")
+            self.turn_assessments = list(state.get("turn_assessments", []))
+            self._pending_turns = [
+                [HumanMessage(content=user), AIMessage(content=assistant)]
+                for user, assistant in state.get("pending_turns", [])
+            ]
+            if self.incremental and self._pending_turns:
+                self._futures.append(_assessment_executor.submit(self._assess_pending))
+
+    def _assess_pending(self):
+        """Assess every pending turn and update the running summary."""
+        with self._assess_lock:
+            with self._lock:
+                turns = list(self._pending_turns)
+            if not turns:
+                return
+            try:
+                with track_stage("supervisor", "assess_turns"):
+                    result = self.llm_service.turn_eval_chain.invoke(
+                        {
+                            "summary": self.running_summary or "(none)",
+                            "turns": self._render(turns),
+                        }
+                    )
+            except Exception as e:
+                # Keep the turns pending, they are retried or evaluated at time-up
+                logger.error("Failed to assess turns: %s", e, exc_info=True)
+                return
+            with self._lock:
+                self.turn_assessments.append(result.assessment)
+                self.running_summary = result.summary
+                del self._pending_turns[: len(turns)]
+
+    @staticmethod
+    def _render(turns) -> str:
+        return ChatPromptValue(
+            messages=[message for turn in turns for message in turn]
+        ).to_string()
+
+    @instrument("supervisor")
     def evaluate(self, state: SupervisorState) -> SupervisorState:
         """Evaluate the chat history with the given scenarios."""
+        if self.incremental and (self.turn_assessments or self._futures):
+            state["feedback"] = self._synthesise()
+            return state
+
         # Get the chat history
         chat_history = state["chat_history"]
         prompt_values = ChatPromptValue(messages=chat_history)
@@ -60,3 +167,23 @@ class SupervisorAgent:
         state["feedback"] = feedback
 
         return state
+
+    def _synthesise(self) -> str:
+        """Write the final feedback from the turn assessments made so far."""
+        # Give in-flight assessments a moment, anything left is passed verbatim
+        wait(self._futures, timeout=float(os.getenv("SUPERVISOR_SYNC_TIMEOUT", 10)))
+        with self._lock:
+            summary = self.running_summary
+            assessments = list(self.turn_assessments)
+            remaining = list(self._pending_turns)
+
+        return self.llm_service.synthesis_chain.invoke(
+            {
+                "summary": summary or "(none)",
+                "assessments": "\n".join(
+                    f"{i + 1}. {assessment}" for i, assessment in enumerate(assessments)
+                )
+                or "(none)",
+                "remaining_turns": self._render(remaining) if remaining else "(none)",
+            }
+        )
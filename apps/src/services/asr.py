@@ -1,3 +1,284 @@
 """
-Create an ASR service with Google Gemini.
+Speech-to-text engines behind one interface.
+
+`GeminiASR`, `BronciASR` and `FakeASR` all implement `transcribe(audio)`.
+`HedgedASR` wraps two engines: when the primary has not answered within its
+recent p90 latency, the same audio is sent to the secondary and whichever
+answers first wins, which flattens the tail latency of voice turns.
+`get_asr_engine` builds the engine configured by ASR_ENGINE and
+ASR_HEDGE_ENGINE, and `transcribe` calls it through the transcription cache.
+`transcribe_streaming` also reports the stable prefix of the transcript while
+it streams in, so that retrieval can start before transcription finishes.
 """
+
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Callable, Iterator
+
+from src.tools.audio_processing import EmptyAudioError, prepare_audio
+from src.tools.models import use_fake_backend
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import registry, track_stage
+from src.utils.transcription_cache import audio_digest, get_transcription_cache
+
+
+logger = setup_logger(__name__)
+
+ASR_HEDGES = "asr_hedged_requests_total"
+
+# Everything up to the last sentence-ending punctuation
+_LAST_BOUNDARY = re.compile(r"^(.*[。？！?!.，,])", re.DOTALL)
+
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="asr-hedge")
+
+
+class ASREngine(ABC):
+    """Base class of the speech-to-text engines."""
+
+    name = "asr"
+
+    def transcribe(self, audio: bytes) -> str:
+        """Transcribe a WAV recording."""
+        with track_stage("asr", self.name):
+            return self._transcribe(audio)
+
+    @abstractmethod
+    def _transcribe(self, audio: bytes) -> str:
+        """Transcribe a WAV recording, without the stage tracking."""
+
+    def transcribe_stream(self, audio: bytes) -> Iterator[str]:
+        """Yield the transcript so far as it grows, ending with the full text.
+
+        Engines without partial results yield the full transcript once.
+        """
+        with track_stage("asr", self.name):
+            yield from self._transcribe_stream(audio)
+
+    def _transcribe_stream(self, audio: bytes) -> Iterator[str]:
+        yield self._transcribe(audio)
+
+
+class GeminiASR(ASREngine):
+    """Transcription by prompting a Gemini model with the audio."""
+
+    name = "gemini"
+
+    def __init__(self, model: str = None):
+        # Imported here so that the fake backend does not need google-genai
+        from google.genai import Client
+
+        self.client = Client(api_key=os.getenv("GOOGLE_API_KEY", ""))
+        self.model = model or os.getenv("GEMINI_ASR_MODEL", "gemini-2.0-flash")
+
+    def _request(self, audio: bytes) -> dict:
+        from google.genai import types
+
+        prepared = prepare_audio(audio, int(os.getenv("GEMINI_ASR_SAMPLE_RATE", 16000)))
+        return {
+            "model": self.model,
+            "contents": [
+                "請將語音轉換為文字。",
+                types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type),
+            ],
+            "config": types.GenerateContentConfig(temperature=0.1),
+        }
+
+    def _transcribe(self, audio: bytes) -> str:
+        return self.client.models.generate_content(**self._request(audio)).text
+
+    def _transcribe_stream(self, audio: bytes) -> Iterator[str]:
+        text = ""
+        for chunk in self.client.models.generate_content_stream(**self._request(audio)):
+            if chunk.text:
+                text += chunk.text
+                yield text
+
+
+class BronciASR(ASREngine):
+    """Transcription by the Bronci ASR service."""
+
+    name = "bronci"
+
+    def __init__(self):
+        from src.tools.audio_to_text import AudioToText
+
+        self.audio_to_text = AudioToText()
+
+    def _transcribe(self, audio: bytes) -> str:
+        return self.audio_to_text(audio)
+
+
+class FakeASR(ASREngine):
+    """Offline engine returning the transcripts scripted on `FakeBackend`."""
+
+    name = "fake"
+
+    def __init__(self):
+        from src.tools.fake_models import FakeTranscriber
+
+        self.transcriber = FakeTranscriber()
+
+    def _transcribe(self, audio: bytes) -> str:
+        return self.transcriber(audio)
+
+
+class HedgedASR(ASREngine):
+    """Send the audio to a second engine when the first one is slow.
+
+    The hedge delay is the `quantile` of the primary's recent successful
+    latencies, or `initial_delay` until `min_samples` have been seen. A
+    failing primary falls back to the secondary straight away. The request
+    that loses the race is left to finish in the background.
+    """
+
+    def __init__(
+        self,
+        primary: ASREngine,
+        secondary: ASREngine,
+        quantile: float = 0.9,
+        initial_delay: float = None,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f"{primary.name}+{secondary.name}"
+        self.quantile = quantile
+        if initial_delay is None:
+            initial_delay = float(os.getenv("ASR_HEDGE_DELAY", 3.0))
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return samples[min(len(samples) - 1, int(self.quantile * len(samples)))]
+
+    def _timed_primary(self, audio: bytes) -> str:
+        start = time.perf_counter()
+        text = self.primary.transcribe(audio)
+        with self._lock:
+            self.latencies.append(time.perf_counter() - start)
+        return text
+
+    def transcribe(self, audio: bytes) -> str:
+        primary = _hedge_executor.submit(self._timed_primary, audio)
+        wait([primary], timeout=self.hedge_delay())
+        if primary.done() and (
+            primary.exception() is None
+            or isinstance(primary.exception(), EmptyAudioError)
+        ):
+            registry.increment(ASR_HEDGES, outcome="not_hedged")
+            return primary.result()
+
+        if primary.done():
+            logger.warning(
+                "%s ASR failed, falling back to %s: %s",
+                self.primary.name,
+                self.secondary.name,
+                primary.exception(),
+            )
+        else:
+            logger.info(
+                "%s ASR slower than %.2f s, hedging with %s",
+                self.primary.name,
+                self.hedge_delay(),
+                self.secondary.name,
+            )
+        secondary = _hedge_executor.submit(self.secondary.transcribe, audio)
+
+        pending = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    winner = "primary" if future is primary else "secondary"
+                    registry.increment(ASR_HEDGES, outcome=f"{winner}_won")
+                    return future.result()
+        registry.increment(ASR_HEDGES, outcome="both_failed")
+        raise primary.exception()
+
+    def _transcribe(self, audio: bytes) -> str:
+        # The engines track their own stages
+        return self.transcribe(audio)
+
+    def transcribe_stream(self, audio: bytes) -> Iterator[str]:
+        """Hedged requests are not streamed: the winner's transcript is
+        yielded once."""
+        yield self.transcribe(audio)
+
+
+ENGINES = {
+    "gemini": GeminiASR,
+    "bronci": BronciASR,
+    "fake": FakeASR,
+}
+
+
+def create_asr_engine(name: str) -> ASREngine:
+    if name not in ENGINES:
+        raise ValueError(f"Unknown ASR engine: {name}")
+    return ENGINES[name]()
+
+
+@lru_cache(maxsize=1)
+def get_asr_engine() -> ASREngine:
+    """The engine configured by ASR_ENGINE, hedged with ASR_HEDGE_ENGINE if set."""
+    if use_fake_backend():
+        return FakeASR()
+    engine = create_asr_engine(os.getenv("ASR_ENGINE", "gemini"))
+    hedge = os.getenv("ASR_HEDGE_ENGINE", "")
+    if hedge:
+        return HedgedASR(engine, create_asr_engine(hedge))
+    return engine
+
+
+def stable_prefix(text: str) -> str:
+    """The part of a partial transcript up to its last sentence boundary,
+    which further partial results will not change."""
+    match = _LAST_BOUNDARY.match(text)
+    return match.group(1) if match else ""
+
+
+def transcribe_streaming(
+    audio: bytes, digest: str = None, on_prefix: Callable[[str], None] = None
+) -> str:
+    """Like `transcribe`, calling `on_prefix` with every new stable prefix of
+    the transcript while it streams in, and with the final text."""
+    engine = get_asr_engine()
+    cache = get_transcription_cache()
+    digest = digest or audio_digest(audio)
+    text = cache.get(engine.name, digest)
+    if text is None:
+        prefix = ""
+        for text in engine.transcribe_stream(audio):
+            if on_prefix is not None and len(stable_prefix(text)) > len(prefix):
+                prefix = stable_prefix(text)
+                on_prefix(prefix)
+        cache.set(engine.name, digest, text)
+    if on_prefix is not None:
+        on_prefix(text)
+    return text
+
+
+def transcribe(audio: bytes, digest: str = None) -> str:
+    """Transcribe with the configured engine, reusing the transcript of
+    identical audio transcribed before."""
+    engine = get_asr_engine()
+    cache = get_transcription_cache()
+    digest = digest or audio_digest(audio)
+    text = cache.get(engine.name, digest)
+    if text is None:
+        text = engine.transcribe(audio)
+        cache.set(engine.name, digest, text)
+    return text
@@ -1,5 +1,4 @@
 import uuid
-from langchain_core.chat_history import InMemoryChatMessageHistory
 from pydantic import BaseModel, Field
 
 from langchain_core.prompts import PromptTemplate
@@ -12,10 +11,14 @@ from src.tools.prompts import (
     create_query_rewrite_prompt,
     create_scenarios_retrivel_prompt,
     create_scenarios_supervisor_prompt,
+    create_supervisor_synthesis_prompt,
+    create_supervisor_turn_prompt,
 )
 from src.services.prompts import *
+from src.services.memory import create_chat_history
 from src.tools.models import create_google_model
 from src.tools.vector_store import retrieve
+from src.utils.response_cache import cache_chain
 
 
 class DocumentGrader(BaseModel):
@@ -34,6 +37,17 @@ class ResponseGrader(BaseModel):
     )
 
 
+class TurnAssessment(BaseModel):
+    """Assessment of the newest turns of a running conversation"""
+
+    assessment: str = Field(
+        description="A short assessment of the user's performance in the newest turns"
+    )
+    summary: str = Field(
+        description="The running summary of the whole conversation so far, including the newest turns"
+    )
+
+
 class RAGLLMService:
     def __init__(self, session_id: str = None, scenarios_description: str = None):
         """Initialize the LLM service with Open AI"""
@@ -46,8 +60,15 @@ class RAGLLMService:
         self.query_rewrite_prompt = create_query_rewrite_prompt(scenarios_description)
         if not session_id:
             session_id = str(uuid.uuid4())
-        self.memory = InMemoryChatMessageHistory(session_id=session_id)
-        self.llm = create_google_model()
+        # Each chain gets its own model tier, graders use a fast and cheap one
+        self.llm = create_google_model("agent")
+        self.grader_llm = create_google_model("grader")
+        self.generator_llm = create_google_model("generator")
+        self.rewriter_llm = create_google_model("rewriter")
+        self.summarizer_llm = create_google_model("summarizer")
+        self.memory = create_chat_history(
+            session_id, summarizer=self._create_summary_chain()
+        )
         self.rag_agent = self._create_retriever_agent()
         self.document_validation_chain = self._create_validation_chain()
         self.rag_response_chain = self._create_rag_response_chain()
@@ -85,24 +106,40 @@ class RAGLLMService:
 
     def _create_validation_chain(self):
         """Create a validation chain for the LLM"""
-        structured_llm_document_grader = self.llm.with_structured_output(DocumentGrader)
+        structured_llm_document_grader = self.grader_llm.with_structured_output(
+            DocumentGrader
+        )
         validation_prompt_template = PromptTemplate.from_template(
             CHUNK_RELEVANCE_PROMPT
         )
-        return validation_prompt_template | structured_llm_document_grader
+        return cache_chain(
+            "document_validation",
+            validation_prompt_template,
+            validation_prompt_template | structured_llm_document_grader,
+            self.grader_llm,
+            output_type=DocumentGrader,
+        )
 
     def _create_rag_response_chain(self):
         """Create a response generator for the RAG LLM"""
         response_prompt = PromptTemplate.from_template(RAG_RESPONSE_PROMPT)
-        return response_prompt | self.llm | StrOutputParser()
+        return response_prompt | self.generator_llm | StrOutputParser()
 
     def _create_response_validation_chain(self):
         """Create a response validation chain for the LLM"""
-        structured_llm_response_grader = self.llm.with_structured_output(ResponseGrader)
+        structured_llm_response_grader = self.grader_llm.with_structured_output(
+            ResponseGrader
+        )
         response_validation_prompt_template = PromptTemplate.from_template(
             RESPONSE_VALIDATION_PROMPT
         )
-        return response_validation_prompt_template | structured_llm_response_grader
+        return cache_chain(
+            "response_validation",
+            response_validation_prompt_template,
+            response_validation_prompt_template | structured_llm_response_grader,
+            self.grader_llm,
+            output_type=ResponseGrader,
+        )
 
     def _create_query_rewriter_chain(self):
         """Create a query rewriter for the LLM"""
@@ -114,7 +151,17 @@ class RAGLLMService:
             ]
         )
 
-        return rewrite_prompt | self.llm | StrOutputParser()
+        return cache_chain(
+            "query_rewrite",
+            rewrite_prompt,
+            rewrite_prompt | self.rewriter_llm | StrOutputParser(),
+            self.rewriter_llm,
+        )
+
+    def _create_summary_chain(self):
+        """Create a chain folding old chat turns into the rolling memory summary"""
+        summary_prompt = PromptTemplate.from_template(CHAT_SUMMARY_PROMPT)
+        return summary_prompt | self.summarizer_llm | StrOutputParser()
 
 
 class EvalLLMService:
@@ -125,11 +172,19 @@ class EvalLLMService:
         """Initialize the LLM service with Open AI"""
         if not scenarios_description:
             scenarios_description = ""
-        self.llm = create_google_model()
+        self.llm = create_google_model("supervisor")
         self.system_prompt = create_scenarios_supervisor_prompt(
             scenarios_description, supervisor_instructions
         )
+        self.turn_prompt = create_supervisor_turn_prompt(
+            scenarios_description, supervisor_instructions
+        )
+        self.synthesis_prompt = create_supervisor_synthesis_prompt(
+            scenarios_description, supervisor_instructions
+        )
         self.eval_chain = self._create_eval_chain()
+        self.turn_eval_chain = self._create_turn_eval_chain()
+        self.synthesis_chain = self._create_synthesis_chain()
 
     def _create_eval_chain(self):
         """
@@ -137,3 +192,17 @@ class EvalLLMService:
         """
         prompt_template = PromptTemplate.from_template(self.system_prompt)
         return prompt_template | self.llm | StrOutputParser()
+
+    def _create_turn_eval_chain(self):
+        """
+        Build the chain assessing the newest turns and updating the running summary.
+        """
+        prompt_template = PromptTemplate.from_template(self.turn_prompt)
+        return prompt_template | self.llm.with_structured_output(TurnAssessment)
+
+    def _create_synthesis_chain(self):
+        """
+        Build the chain writing the final feedback from the turn assessments.
+        """
+        prompt_template = PromptTemplate.from_template(self.synthesis_prompt)
+        return prompt_template | self.llm | StrOutputParser()
@@ -0,0 +1,260 @@
+"""
+Bounded chat memory for the RAG agent.
+
+Only a window of the most recent messages is replayed into the agent prompt.
+Messages falling out of the window are folded into a rolling summary by a
+background thread, so the prompt size stays constant over a session and the
+summarisation never blocks a chat turn.
+
+Inside `chat_turn(turn_id)` the messages of a turn are only added once per
+turn id, so a turn run again after a failure does not duplicate them.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Sequence, Tuple
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    SystemMessage,
+    get_buffer_string,
+    message_to_dict,
+    messages_from_dict,
+)
+from redis import Redis
+
+from src.utils.log_handler import setup_logger
+from src.utils.data_access import get_redis
+
+
+logger = setup_logger(__name__)
+
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chat-summary")
+
+# Id of the chat turn being run in this context, see `chat_turn`
+_turn_id = ContextVar("chat_turn_id", default=None)
+
+
+@contextmanager
+def chat_turn(turn_id: str):
+    """Make the memory writes of the block idempotent for this turn id."""
+    token = _turn_id.set(turn_id)
+    try:
+        yield
+    finally:
+        _turn_id.reset(token)
+
+
+class SummaryBufferChatHistory(BaseChatMessageHistory):
+    """Chat history with a window of recent messages and a rolling summary.
+
+    Messages pushed out of the window are queued as "pending" and summarised
+    asynchronously; until the summary has caught up they are still returned,
+    so no context is lost in between. Without a summarizer the history is a
+    plain sliding window.
+
+    This class keeps everything in process; `RedisSummaryBufferChatHistory`
+    overrides the storage hooks to share the history across processes.
+    """
+
+    def __init__(self, session_id: str, summarizer=None, window: int = 6):
+        self.session_id = session_id
+        self.summarizer = summarizer
+        self.window = max(1, window)
+        self._summary = ""
+        self._pending = []
+        self._recent = []
+        self._turns = set()
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+
+    # --- storage hooks ---
+    def _load(self) -> Tuple[str, List[BaseMessage], List[BaseMessage]]:
+        """Return the summary, the pending messages and the recent window."""
+        with self._lock:
+            return self._summary, list(self._pending), list(self._recent)
+
+    def _append(self, messages: List[BaseMessage], keep_overflow: bool) -> bool:
+        """Append messages to the window, moving the overflow to pending.
+
+        Returns whether any message overflowed the window.
+        """
+        with self._lock:
+            self._recent.extend(messages)
+            overflow = self._recent[: -self.window]
+            self._recent = self._recent[-self.window :]
+            if keep_overflow:
+                self._pending.extend(overflow)
+        return bool(overflow)
+
+    def _claim_turn(self, turn_id: str) -> bool:
+        """Record that the turn's messages are added, False if they already were."""
+        with self._lock:
+            if turn_id in self._turns:
+                return False
+            self._turns.add(turn_id)
+            return True
+
+    def _commit_summary(self, summary: str, folded: int):
+        """Store the new summary and drop the first `folded` pending messages."""
+        with self._lock:
+            self._summary = summary
+            del self._pending[:folded]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._summary = ""
+            self._pending = []
+            self._recent = []
+            self._turns = set()
+
+    # --- BaseChatMessageHistory ---
+    @property
+    def messages(self) -> List[BaseMessage]:
+        summary, pending, recent = self._load()
+        context = []
+        if summary:
+            context.append(
+                SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")
+            )
+        return context + pending + recent
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        # The agent output may be the raw list of retrieved documents
+        messages = [
+            m if isinstance(m, BaseMessage) else AIMessage(content=str(m))
+            for m in messages
+        ]
+        if not messages:
+            return
+        turn_id = _turn_id.get()
+        if turn_id is not None and not self._claim_turn(turn_id):
+            logger.info(
+                "Turn %s of session %s is already in memory", turn_id, self.session_id
+            )
+            return
+        overflowed = self._append(messages, keep_overflow=self.summarizer is not None)
+        if overflowed and self.summarizer is not None:
+            _summary_executor.submit(self._fold_pending)
+
+    def _fold_pending(self):
+        """Fold every pending message into the summary (runs in the background)."""
+        with self._fold_lock:
+            summary, pending, _ = self._load()
+            if not pending:
+                return
+            try:
+                new_summary = self.summarizer.invoke(
+                    {
+                        "summary": summary or "(none)",
+                        "new_lines": get_buffer_string(pending),
+                    }
+                )
+            except Exception as e:
+                # Keep the messages pending, the next fold will retry them
+                logger.error(
+                    "Failed to summarise chat history for session %s: %s",
+                    self.session_id,
+                    e,
+                    exc_info=True,
+                )
+                return
+            self._commit_summary(new_summary.strip(), len(pending))
+
+
+class RedisSummaryBufferChatHistory(SummaryBufferChatHistory):
+    """`SummaryBufferChatHistory` persisted in Redis, so that the history
+    survives restarts and is shared by every process serving the session."""
+
+    def __init__(
+        self,
+        session_id: str,
+        redis_connection: Redis,
+        summarizer=None,
+        window: int = 6,
+        ttl: int = None,
+    ):
+        super().__init__(session_id, summarizer=summarizer, window=window)
+        self.redis_client = redis_connection
+        self.ttl = ttl
+        prefix = f"chat_memory:{session_id}"
+        self.turn_prefix = f"{prefix}:turn:"
+        self.summary_key = f"{prefix}:summary"
+        self.pending_key = f"{prefix}:pending"
+        self.recent_key = f"{prefix}:recent"
+
+    @staticmethod
+    def _dumps(messages: List[BaseMessage]) -> List[str]:
+        return [json.dumps(message_to_dict(m), ensure_ascii=False) for m in messages]
+
+    @staticmethod
+    def _loads(payloads: List[str]) -> List[BaseMessage]:
+        return messages_from_dict([json.loads(p) for p in payloads])
+
+    def _expire(self, pipe):
+        if self.ttl:
+            for key in (self.summary_key, self.pending_key, self.recent_key):
+                pipe.expire(key, self.ttl)
+
+    def _load(self):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(self.summary_key)
+        pipe.lrange(self.pending_key, 0, -1)
+        pipe.lrange(self.recent_key, 0, -1)
+        summary, pending, recent = pipe.execute()
+        return summary or "", self._loads(pending), self._loads(recent)
+
+    def _append(self, messages, keep_overflow):
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.rpush(self.recent_key, *self._dumps(messages))
+        pipe.lrange(self.recent_key, 0, -(self.window + 1))
+        pipe.ltrim(self.recent_key, -self.window, -1)
+        overflow = pipe.execute()[1]
+
+        pipe = self.redis_client.pipeline(transaction=True)
+        if overflow and keep_overflow:
+            pipe.rpush(self.pending_key, *overflow)
+        self._expire(pipe)
+        pipe.execute()
+        return bool(overflow)
+
+    def _claim_turn(self, turn_id):
+        return bool(
+            self.redis_client.set(self.turn_prefix + turn_id, 1, nx=True, ex=self.ttl)
+        )
+
+    def _commit_summary(self, summary, folded):
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.set(self.summary_key, summary)
+        pipe.ltrim(self.pending_key, folded, -1)
+        self._expire(pipe)
+        pipe.execute()
+
+    def clear(self) -> None:
+        self.redis_client.delete(self.summary_key, self.pending_key, self.recent_key)
+
+
+def create_chat_history(session_id: str, summarizer=None) -> SummaryBufferChatHistory:
+    """Create the chat history for a session from the environment.
+
+    CHAT_MEMORY_BACKEND selects "redis" (default) or "memory",
+    CHAT_MEMORY_WINDOW the number of recent messages replayed verbatim and
+    CHAT_MEMORY_TTL how long (seconds) an idle Redis history is kept.
+    """
+    window = int(os.getenv("CHAT_MEMORY_WINDOW", 6))
+    if os.getenv("CHAT_MEMORY_BACKEND", "redis").lower() == "memory":
+        return SummaryBufferChatHistory(session_id, summarizer=summarizer, window=window)
+
+    return RedisSummaryBufferChatHistory(
+        session_id,
+        get_redis(),
+        summarizer=summarizer,
+        window=window,
+        ttl=int(os.getenv("CHAT_MEMORY_TTL", 86400)) or None,
+    )
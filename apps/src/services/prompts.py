@@ -72,3 +72,50 @@ Chat History: {chat_history}
 
 Your evaluation and feedback:
 """
+
+CHAT_SUMMARY_PROMPT = """
+You are maintaining a running summary of a conversation between a user and an AI assistant.
+Extend the current summary with the new lines of conversation, keeping the facts, questions and answers that later turns may refer to.
+Keep the summary concise and write it in Traditional Chinese.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:
+"""
+
+SUPERVISOR_TURN_PROMPT = """
+You are a supervisor following a training conversation while it happens.
+With given scenarios and instructions, assess the user's performance in the newest turns of the conversation, and update the running summary of the whole conversation so far.
+Keep both short, they will be used for the final evaluation. Do not forget to answer in Traditional Chinese.
+
+Instructions: {instructions}
+
+Scenarios: {scenarios}
+
+Running summary: {summary}
+
+Newest turns: {turns}
+"""
+
+SUPERVISOR_SYNTHESIS_PROMPT = """
+You are a supervisor. 
+With given scenarios, a summary of the conversation and the assessments made turn by turn, you need to evaluate the user's performance and make a concise summary of the conversation. 
+Please provide feedback on the user's performance and suggest improvements if necessary.
+Do not forget to answer in Traditional Chinese.
+
+Instructions: {instructions}
+
+Scenarios: {scenarios}
+
+Conversation summary: {summary}
+
+Turn assessments: {assessments}
+
+Turns not assessed yet: {remaining_turns}
+
+Your evaluation and feedback:
+"""
@@ -0,0 +1,326 @@
+"""
+Audio preprocessing before speech-to-text.
+
+Browser recordings from `st.audio_input` are high-rate WAV, much larger than
+what the ASR engines use. `prepare_audio` downmixes them to mono, resamples
+them to the engine's rate with vectorised NumPy and optionally encodes them
+with a compact codec through ffmpeg (ASR_AUDIO_CODEC), so that less audio is
+uploaded on every voice turn. Leading and trailing silence is trimmed by an
+energy and zero-crossing voice activity detector (ASR_VAD), and silent
+recordings raise EmptyAudioError before any API call.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import wave
+from typing import List
+
+import numpy as np
+
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import ASR_AUDIO_SECONDS, registry
+
+
+logger = setup_logger(__name__)
+
+# codec: (ffmpeg arguments, mime type, file extension)
+CODECS = {
+    "flac": (["-c:a", "flac", "-f", "flac"], "audio/flac", "flac"),
+    "opus": (["-c:a", "libopus", "-b:a", "24k", "-f", "ogg"], "audio/ogg", "ogg"),
+    "mp3": (["-c:a", "libmp3lame", "-b:a", "32k", "-f", "mp3"], "audio/mp3", "mp3"),
+}
+
+
+class EmptyAudioError(ValueError):
+    """The recording contains no speech."""
+
+
+class PreparedAudio:
+    """Audio ready to upload, with its mime type and file extension."""
+
+    def __init__(self, data: bytes, mime_type: str, extension: str, sample_rate=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.extension = extension
+        self.sample_rate = sample_rate
+        # Seconds of audio before and after silence trimming
+        self.original_seconds = None
+        self.removed_seconds = 0.0
+        # Segment starting before the end of the previous one (a hard cut)
+        self.overlaps_previous = False
+
+
+def decode_wav(data: bytes):
+    """Decode PCM WAV bytes to float32 samples of shape (frames, channels)."""
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 2**15
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        as_int = (
+            raw[:, 0].astype(np.int32)
+            | (raw[:, 1].astype(np.int32) << 8)
+            | (raw[:, 2].astype(np.int32) << 16)
+        )
+        as_int = np.where(as_int & 0x800000, as_int - 0x1000000, as_int)
+        samples = as_int.astype(np.float32) / 2**23
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"Unsupported sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def encode_wav(samples: np.ndarray, rate: int) -> bytes:
+    """Encode mono float samples as 16-bit PCM WAV."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def downmix(samples: np.ndarray) -> np.ndarray:
+    """Average the channels into one."""
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1)
+
+
+def resample(samples: np.ndarray, rate: int, target_rate: int) -> np.ndarray:
+    """Resample mono audio, low-pass filtering first when downsampling."""
+    if rate == target_rate or len(samples) == 0:
+        return samples
+    if target_rate < rate:
+        # Windowed-sinc anti-aliasing filter just below the new Nyquist frequency
+        cutoff = 0.45 * target_rate / rate
+        taps = np.arange(63) - 31
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(63)
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    duration = len(samples) / rate
+    positions = np.arange(int(duration * target_rate)) * (rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_features(samples: np.ndarray, rate: int, frame_ms: int = 20):
+    """Energy in dBFS and zero-crossing rate of consecutive frames."""
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    frames = samples[: count * frame].reshape(count, frame)
+    energy = 10 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy, zcr, frame
+
+
+def detect_speech(
+    samples: np.ndarray,
+    rate: int,
+    threshold_db: float = 12.0,
+    min_energy_db: float = -55.0,
+    speech_db: float = -35.0,
+    hangover_ms: int = 200,
+):
+    """Per-frame speech mask and the frame length in samples.
+
+    A frame is speech when its energy is `threshold_db` above the noise
+    floor (the 10th percentile frame energy) and above `min_energy_db`, or
+    above `speech_db` outright, for recordings with hardly any silence to
+    estimate the floor from. Quieter frames with a high zero-crossing rate,
+    typical of fricatives, count as speech too. The mask is then extended
+    by `hangover_ms` on both sides so that word onsets and tails are not cut.
+    """
+    energy, zcr, frame = frame_features(samples, rate)
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool), frame
+    floor = np.percentile(energy, 10)
+    loud = (energy > max(floor + threshold_db, min_energy_db)) | (energy > speech_db)
+    fricative = (energy > max(floor + threshold_db / 2, min_energy_db)) & (zcr > 0.3)
+    speech = loud | fricative
+
+    hangover = max(1, hangover_ms * rate // 1000 // frame)
+    window = np.ones(2 * hangover + 1)
+    # Centred on each frame, and as long as `speech` even when the window is
+    # longer than the recording
+    extended = np.convolve(speech.astype(float), window)
+    extended = extended[hangover : hangover + len(speech)]
+    return extended > 0, frame
+
+
+def trim_silence(samples: np.ndarray, rate: int, max_pause: float = None):
+    """Trim leading and trailing silence, and shorten internal pauses longer
+    than `max_pause` seconds. Returns the samples and the seconds removed.
+
+    Raises EmptyAudioError when no speech is found.
+    """
+    speech, frame = detect_speech(samples, rate)
+    if not speech.any():
+        raise EmptyAudioError("No speech detected in the recording.")
+
+    keep = np.ones(len(samples), dtype=bool)
+    silent = ~speech
+    if max_pause and silent.any():
+        # Keep the first `max_pause` seconds of every silent run
+        limit = int(max_pause * rate / frame)
+        run_starts = silent & ~np.concatenate(([False], silent[:-1]))
+        start_of_run = np.flatnonzero(run_starts)[np.maximum(np.cumsum(run_starts) - 1, 0)]
+        long_pause = silent & (np.arange(len(speech)) - start_of_run >= limit)
+        keep[: len(speech) * frame] = np.repeat(~long_pause, frame)
+
+    first, last = np.flatnonzero(speech)[[0, -1]]
+    keep[: first * frame] = False
+    keep[(last + 1) * frame :] = False
+    trimmed = samples[keep]
+    return trimmed, (len(samples) - len(trimmed)) / rate
+
+
+def encode(samples: np.ndarray, rate: int, codec: str = None) -> PreparedAudio:
+    """Encode mono samples, as WAV or with `codec` when ffmpeg is available."""
+    wav = encode_wav(samples, rate)
+    if not codec or codec == "wav":
+        return PreparedAudio(wav, "audio/wav", "wav", rate)
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported codec: {codec}")
+    if shutil.which("ffmpeg") is None:
+        logger.warning("ffmpeg not found, uploading %s audio as WAV", codec)
+        return PreparedAudio(wav, "audio/wav", "wav", rate)
+
+    arguments, mime_type, extension = CODECS[codec]
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "wav", "-i", "pipe:0"]
+        + arguments
+        + ["pipe:1"],
+        input=wav,
+        capture_output=True,
+        timeout=30,
+    )
+    if result.returncode != 0:
+        logger.warning("ffmpeg failed, uploading WAV: %s", result.stderr.decode()[-200:])
+        return PreparedAudio(wav, "audio/wav", "wav", rate)
+    return PreparedAudio(result.stdout, mime_type, extension, rate)
+
+
+def split_at_silence(
+    samples: np.ndarray, rate: int, max_seconds: float, overlap_seconds: float = 0.5
+):
+    """Split audio into segments of at most `max_seconds`.
+
+    Each cut is placed at the quietest silent frame in the last third of the
+    segment. When there is no silence to cut at, the segment is cut hard and
+    the next one starts `overlap_seconds` earlier, so that no word is lost.
+    Returns `(start, end, overlaps_previous)` sample ranges.
+    """
+    if len(samples) <= max_seconds * rate:
+        return [(0, len(samples), False)]
+    speech, frame = detect_speech(samples, rate)
+    energy, _, _ = frame_features(samples, rate)
+    max_frames = int(max_seconds * rate / frame)
+    search = max(1, max_frames // 3)
+    overlap = min(int(overlap_seconds * rate / frame), max_frames // 2)
+
+    segments = []
+    start, overlaps = 0, False
+    while len(speech) - start > max_frames:
+        low = start + max_frames - search
+        silent = np.flatnonzero(~speech[low : start + max_frames])
+        if len(silent):
+            cut = low + silent[np.argmin(energy[low + silent])]
+            segments.append((start * frame, cut * frame, overlaps))
+            start, overlaps = cut, False
+        else:
+            cut = start + max_frames
+            segments.append((start * frame, cut * frame, overlaps))
+            start, overlaps = cut - overlap, True
+    segments.append((start * frame, len(samples), overlaps))
+    return segments
+
+
+def prepare_audio(
+    data: bytes,
+    target_rate: int,
+    codec: str = None,
+    vad: bool = None,
+    max_pause: float = None,
+) -> PreparedAudio:
+    """Downmix, resample, trim and encode recorded audio for an ASR engine.
+
+    Audio that is not PCM WAV is passed through unchanged. Raises
+    EmptyAudioError for empty or silent recordings.
+    """
+    return prepare_segments(data, target_rate, None, codec, vad, max_pause)[0]
+
+
+def prepare_segments(
+    data: bytes,
+    target_rate: int,
+    max_seconds: float = None,
+    codec: str = None,
+    vad: bool = None,
+    max_pause: float = None,
+) -> List[PreparedAudio]:
+    """Like `prepare_audio`, but split long recordings at silence into
+    segments of at most `max_seconds` which can be transcribed in parallel.
+    """
+    if codec is None:
+        codec = os.getenv("ASR_AUDIO_CODEC", "")
+    if vad is None:
+        vad = os.getenv("ASR_VAD", "true").lower() in ("1", "true", "yes")
+    if max_pause is None:
+        max_pause = float(os.getenv("ASR_VAD_MAX_PAUSE", 0)) or None
+    if not data:
+        raise EmptyAudioError("The recording is empty.")
+    try:
+        samples, rate = decode_wav(data)
+    except (wave.Error, EOFError, ValueError) as e:
+        logger.info("Not preprocessing audio that is not PCM WAV: %s", e)
+        return [PreparedAudio(data, "audio/wav", "wav")]
+    if len(samples) == 0:
+        raise EmptyAudioError("The recording is empty.")
+
+    target_rate = min(rate, target_rate)
+    mono = resample(downmix(samples), rate, target_rate)
+    original_seconds = len(mono) / target_rate
+    removed_seconds = 0.0
+    if vad:
+        mono, removed_seconds = trim_silence(mono, target_rate, max_pause)
+        registry.observe(ASR_AUDIO_SECONDS, original_seconds, part="recorded")
+        registry.observe(ASR_AUDIO_SECONDS, removed_seconds, part="silence_removed")
+
+    bounds = (
+        split_at_silence(mono, target_rate, max_seconds)
+        if max_seconds
+        else [(0, len(mono), False)]
+    )
+    segments = []
+    for start, end, overlaps in bounds:
+        prepared = encode(mono[start:end], target_rate, codec)
+        prepared.original_seconds = original_seconds
+        prepared.removed_seconds = removed_seconds
+        prepared.overlaps_previous = overlaps
+        segments.append(prepared)
+    logger.info(
+        "Prepared audio: %d Hz x %d ch, %d bytes -> %d Hz mono %s, %d bytes "
+        "in %d segment(s), %.2f of %.2f s of silence removed",
+        rate,
+        samples.shape[1],
+        len(data),
+        target_rate,
+        segments[0].extension,
+        sum(len(segment.data) for segment in segments),
+        len(segments),
+        removed_seconds,
+        original_seconds,
+    )
+    return segments
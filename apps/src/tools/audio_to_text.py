@@ -1,37 +1,125 @@
+import asyncio
+import codecs
 import os
-import tempfile
+import re
+import threading
 import time
-from typing import Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 import requests
-import tempfile
+from requests.adapters import HTTPAdapter
 from typing import Literal
 
+from src.tools.audio_processing import prepare_segments
 from src.utils.log_handler import setup_logger
 
 
 logger = setup_logger(__name__)
 
+# "說話者1：" / "SPEAKER_01: " style labels at the start of a .dia line
+SPEAKER_LABEL = re.compile(r"^(\s*[^\s:：]{1,20}[:：]\s*)(.*)$")
+
+# A path to an audio file, or the audio itself
+AudioSource = Union[str, bytes, bytearray, memoryview]
+
+
+def audio_name(audio: AudioSource, default: str = "audio.wav") -> str:
+    """File name to upload the audio under."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return default
+    return os.path.basename(audio)
+
+
+class TranscriptionTimeout(TimeoutError):
+    """The transcription did not finish before its deadline."""
+
+
+class TranscriptionCancelled(Exception):
+    """The transcription was cancelled by the caller."""
+
 
 class BronciWrapper:
+    """
+    Client of the Bronci ASR API.
+
+    All calls share one keep-alive session with a connection pool, so polls
+    and downloads reuse connections, also across concurrent transcriptions.
+    The client logs in on the first call and logs in again when the token
+    is rejected. The `a`-prefixed methods are asyncio variants running on
+    the same pool.
+    """
 
     def __init__(self) -> None:
         self.username = os.getenv("BRONCI_USERNAME", "ASR0307_27714944")
         self.password = os.getenv("BRONCI_PASSWORD", "Api030727714944")
-        self.api_url = os.getenv("BRONCI_API_URL", "https://asrapi01.bronci.com.tw")
+        self.api_url = os.getenv(
+            "BRONCI_API_URL", "https://asrapi01.bronci.com.tw"
+        ).rstrip("/")
         self.model = os.getenv("BRONCI_MODEL", "basic-taigi.2024.06.27")
-        self.token = self.login()
-        if not self.token:
-            raise ValueError("Failed to get authentication token.")
+        # (connect, read) timeouts in seconds
+        self.timeout = (
+            float(os.getenv("BRONCI_CONNECT_TIMEOUT", 5)),
+            float(os.getenv("BRONCI_READ_TIMEOUT", 30)),
+        )
+
+        # Task polling: first interval, growth factor and cap, overall deadline
+        self.poll_initial = float(os.getenv("BRONCI_POLL_INITIAL", 0.2))
+        self.poll_backoff = float(os.getenv("BRONCI_POLL_BACKOFF", 1.5))
+        self.poll_max = float(os.getenv("BRONCI_POLL_MAX", 2.0))
+        self.transcribe_timeout = float(os.getenv("BRONCI_TRANSCRIBE_TIMEOUT", 120))
+        self.batch_concurrency = int(os.getenv("BRONCI_BATCH_CONCURRENCY", 8))
+
+        pool_size = int(os.getenv("BRONCI_POOL_SIZE", 16))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._token = None
+        self._token_lock = threading.Lock()
+
+    @property
+    def token(self) -> str:
+        """The authentication token, logging in on first use."""
+        if self._token is None:
+            self._refresh_token(None)
+        return self._token
+
+    def _refresh_token(self, stale_token):
+        """Log in again unless another thread already replaced `stale_token`."""
+        with self._token_lock:
+            if self._token == stale_token:
+                self._token = self.login()
+                if not self._token:
+                    raise ValueError("Failed to get authentication token.")
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send an authenticated request, logging in again once on 401."""
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(2):
+            token = self.token
+            response = self.session.request(
+                method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+            )
+            if response.status_code == 401 and attempt == 0:
+                logger.info("Authentication token rejected, logging in again.")
+                response.close()
+                self._refresh_token(token)
+                continue
+            response.raise_for_status()
+            return response
 
     def login(self):
         """Logs in to the ASR service and returns the authentication token."""
         login_url = f"{self.api_url}/api/v1/login"
         credentials = {"username": self.username, "password": self.password}
         try:
-            response = requests.post(
+            response = self.session.post(
                 login_url,
                 json=credentials,
                 headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
             )
             response.raise_for_status()
             data = response.json()
@@ -44,28 +132,40 @@ class BronciWrapper:
             raise
 
     def post_subtitle_task(
-        self, audio_path, title="sample", description="sample", speaker_number=1
+        self,
+        audio: AudioSource,
+        title="sample",
+        description="sample",
+        speaker_number=1,
+        filename: str = None,
     ) -> Tuple[int, int]:
-        """Posts a subtitle task to the ASR service."""
+        """Posts a subtitle task to the ASR service.
+
+        `audio` is a file path or the audio itself as bytes or a memoryview,
+        which is uploaded straight from memory.
+        """
 
         subtitle_url = f"{self.api_url}/api/v1/subtitle/tasks"
-        headers = {"Authorization": f"Bearer {self.token}"}
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            payload = audio
+        else:
+            # Read up front so that the upload can be repeated after a re-login
+            with open(audio, "rb") as audio_file:
+                payload = audio_file.read()
+        files = {"filename": (filename or audio_name(audio), payload)}
         try:
-            with open(audio_path, "rb") as audio_file:
-                files = {"filename": audio_file}
-                response = requests.post(
-                    subtitle_url,
-                    headers=headers,
-                    files=files,
-                    data={
-                        "title": title,
-                        "description": description,
-                        "modelVersion": self.model,
-                        "speakerNum": speaker_number,
-                        "sourceType": 2,
-                    },
-                )
-            response.raise_for_status()
+            response = self._request(
+                "POST",
+                subtitle_url,
+                files=files,
+                data={
+                    "title": title,
+                    "description": description,
+                    "modelVersion": self.model,
+                    "speakerNum": speaker_number,
+                    "sourceType": 2,
+                },
+            )
             data = response.json()
 
             if data["code"] != 200:
@@ -87,12 +187,9 @@ class BronciWrapper:
     def get_subtitle_task(self, task_id: int) -> int:
         """Retrieves the status of a subtitle task."""
         subtitle_url = f"{self.api_url}/api/v1/subtitle/tasks/{task_id}"
-        headers = {"Authorization": f"Bearer {self.token}"}
 
         try:
-            response = requests.get(subtitle_url, headers=headers)
-            response.raise_for_status()
-            results = response.json()
+            results = self._request("GET", subtitle_url).json()
             if results["code"] == 200:
                 return results["data"][0]["status"]
             else:
@@ -104,15 +201,10 @@ class BronciWrapper:
 
     def get_url(self, task_id: int) -> str:
         """Downloads the transcribed subtitle file."""
-        subtitle_url = f"https://asrapi01.bronci.com.tw/api/v1/subtitle/tasks/{task_id}/subtitle-link"
-        headers = {"Authorization": f"Bearer {self.token}"}
+        subtitle_url = f"{self.api_url}/api/v1/subtitle/tasks/{task_id}/subtitle-link"
 
         try:
-            response = requests.get(
-                subtitle_url, headers=headers, params={"type": "DIA"}
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self._request("GET", subtitle_url, params={"type": "DIA"}).json()
             if data.get("code") != 200:
                 raise ValueError(f"Failed to get subtitle link: {data}")
             return data["data"][0]["url"]
@@ -121,9 +213,7 @@ class BronciWrapper:
             raise
 
     def download_and_extract_text(self, url: str):
-        """Downloads a file from a URL, saves it to a temporary file,
-        reads its content, and returns the content as a string.
-        Cleans up the temporary file afterwards.
+        """Downloads a transcript and decodes it from the response stream.
 
         Args:
             url: The URL of the file to download.
@@ -132,86 +222,291 @@ class BronciWrapper:
             The text content of the file as a string, or None if an error occurred.
         """
         try:
-            # Download the file
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".dia") as temp_file:
-                # Write the downloaded content to the temporary file
-                for chunk in response.iter_content(chunk_size=8192):
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name  # Store the path
-
-            # Read the content from the temporary file
-            with open(temp_file_path, "r", encoding="utf-8") as f:
-                file_content = f.read()
-
-            return file_content
-
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                # Incremental, so multi-byte characters split across chunks decode
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                parts = [
+                    decoder.decode(chunk)
+                    for chunk in response.iter_content(chunk_size=8192)
+                ]
+                parts.append(decoder.decode(b"", final=True))
+            return "".join(parts)
         except requests.exceptions.RequestException as e:
-            print(f"Error downloading the file: {e}")
+            logger.error("Error downloading the file: %s", e)
             return None
-        except IOError as e:
-            print(f"Error reading the file: {e}")
+        except UnicodeDecodeError as e:
+            logger.error("Error decoding the file: %s", e)
             return None
-        finally:
-            # Clean up the temporary file (important!)
-            if "temp_file_path" in locals():
-                try:
-                    os.remove(temp_file_path)
-                except OSError as e:
-                    print(
-                        f"Warning - could not delete temporary file"
-                        f" {temp_file_path}: {e}"
-                    )
 
     def delete_task(self, task_id: int):
         """Deletes a subtitle task."""
         subtitle_url = f"{self.api_url}/api/v1/subtitle/tasks/{task_id}"
-        headers = {"Authorization": f"Bearer {self.token}"}
 
         try:
-            response = requests.delete(subtitle_url, headers=headers)
-            response.raise_for_status()
+            self._request("DELETE", subtitle_url)
         except requests.RequestException as e:
             logger.error("Failed to delete subtitle task: %s", e)
             raise
 
+    def wait_for_task(
+        self,
+        task_id: int,
+        deadline: float = None,
+        cancel_event: threading.Event = None,
+    ):
+        """Poll a subtitle task until it is done.
+
+        Polls start fast and back off exponentially, so short clips are
+        picked up soon after they finish without hammering the API on long
+        ones. Raises TranscriptionTimeout once the monotonic `deadline` has
+        passed and TranscriptionCancelled when `cancel_event` is set.
+        """
+        delay = self.poll_initial
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise TranscriptionCancelled(f"Transcription task {task_id} cancelled")
+            if self.get_subtitle_task(task_id) == 3:
+                return
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TranscriptionTimeout(
+                    f"Transcription task {task_id} did not finish in time"
+                )
+            sleep = delay if remaining is None else min(delay, remaining)
+            if cancel_event is not None:
+                cancel_event.wait(sleep)
+            else:
+                time.sleep(sleep)
+            delay = min(delay * self.poll_backoff, self.poll_max)
+
     def transcribe(
         self,
-        audio_path,
+        audio: AudioSource,
         title="sample",
         description="sample",
         speaker_number=2,
-        max_retry=30,
+        timeout: float = None,
+        cancel_event: threading.Event = None,
+        filename: str = None,
     ) -> str:
-        logger.info("Transcribing audio file: %s", audio_path)
+        """Transcribe an audio file or in-memory audio, giving up after
+        `timeout` seconds.
+
+        The server-side task is deleted whether the transcription succeeds,
+        fails, times out or is cancelled.
+        """
+        if timeout is None:
+            timeout = self.transcribe_timeout
+        deadline = time.monotonic() + timeout
+
+        filename = filename or audio_name(audio)
+        logger.info("Transcribing audio file: %s", filename)
         task_id, _ = self.post_subtitle_task(
-            audio_path, title, description, speaker_number
+            audio, title, description, speaker_number, filename
         )
         logger.info("Get transcription task id: %s", task_id)
-        retry = 0
-        while True:
-            if retry <= max_retry:
-                status = self.get_subtitle_task(task_id)
-                if status != 3:
-                    time.sleep(2)
-                    continue
-            break
+        try:
+            self.wait_for_task(task_id, deadline, cancel_event)
+            return self._fetch_text(task_id)
+        finally:
+            self._delete_quietly(task_id)
 
+    def _fetch_text(self, task_id: int) -> str:
+        """Download the text of a finished task."""
         url = f"{self.get_url(task_id)}?token={self.token}"
         text = self.download_and_extract_text(url)
         logger.info("Get transcription text: %s", text)
         if text:
-            self.delete_task(task_id)
             return text
         raise ValueError("Failed to transcribe audio file.")
 
+    def _delete_quietly(self, task_id: int):
+        try:
+            self.delete_task(task_id)
+        except requests.RequestException:
+            # Already logged, the task expires on the server eventually
+            pass
+
+    def transcribe_batch(
+        self,
+        audio_paths: Iterable[str],
+        max_in_flight: int = None,
+        timeout: float = None,
+        speaker_number=2,
+    ) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+        """Transcribe many audio files concurrently.
+
+        Up to `max_in_flight` files are uploaded or transcribing at once.
+        All submitted tasks are polled from this one loop, each with its own
+        backoff, and `(audio_path, text, error)` is yielded as soon as a file
+        is done, in completion order. A failing file yields its error
+        without affecting the others; `timeout` applies to each file.
+        """
+        if max_in_flight is None:
+            max_in_flight = self.batch_concurrency
+        if timeout is None:
+            timeout = self.transcribe_timeout
+
+        pending = deque(audio_paths)
+        # Uploads and downloads, keyed by future: (audio_path, task_id)
+        calls = {}
+        # Tasks transcribing on the server: task_id -> [audio_path, deadline, next_poll, delay]
+        tasks = {}
+        executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="asr-batch"
+        )
+        try:
+            while pending or calls or tasks:
+                while pending and len(calls) + len(tasks) < max_in_flight:
+                    audio_path = pending.popleft()
+                    future = executor.submit(
+                        self.post_subtitle_task,
+                        audio_path,
+                        audio_name(audio_path),
+                        "batch",
+                        speaker_number,
+                    )
+                    calls[future] = (audio_path, None)
+
+                # Poll every task that is due, in parallel over the pool
+                now = time.monotonic()
+                due = [i for i, task in tasks.items() if task[2] <= now]
+                statuses = executor.map(self._poll_quietly, due)
+                for task_id, status in zip(due, statuses):
+                    audio_path, deadline, _, delay = tasks[task_id]
+                    if status == 3:
+                        del tasks[task_id]
+                        calls[executor.submit(self._fetch_text, task_id)] = (
+                            audio_path,
+                            task_id,
+                        )
+                    elif isinstance(status, Exception) or now >= deadline:
+                        del tasks[task_id]
+                        self._delete_quietly(task_id)
+                        error = (
+                            status
+                            if isinstance(status, Exception)
+                            else TranscriptionTimeout(
+                                f"Transcription of {audio_path} did not finish in time"
+                            )
+                        )
+                        yield audio_path, None, error
+                    else:
+                        tasks[task_id][2:] = [
+                            now + delay,
+                            min(delay * self.poll_backoff, self.poll_max),
+                        ]
+
+                # Sleep until the next poll is due or an upload/download ends
+                sleep = min((task[2] for task in tasks.values()), default=now + 1) - now
+                done, _ = wait(
+                    list(calls), timeout=max(0, sleep), return_when=FIRST_COMPLETED
+                )
+                if not calls and sleep > 0:
+                    time.sleep(sleep)
+                for future in done:
+                    audio_path, task_id = calls.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if task_id is not None:
+                            self._delete_quietly(task_id)
+                        yield audio_path, None, e
+                        continue
+                    if task_id is None:
+                        task_id, _ = result
+                        tasks[task_id] = [
+                            audio_path,
+                            time.monotonic() + timeout,
+                            time.monotonic() + self.poll_initial,
+                            self.poll_initial * self.poll_backoff,
+                        ]
+                    else:
+                        self._delete_quietly(task_id)
+                        yield audio_path, result, None
+        finally:
+            # Also reached when the caller stops iterating early
+            executor.shutdown(wait=True, cancel_futures=True)
+            for task_id in tasks:
+                self._delete_quietly(task_id)
+            # Tasks still being uploaded or downloaded when the loop stopped
+            for future, (_, task_id) in calls.items():
+                if task_id is None:
+                    if future.cancelled() or future.exception() is not None:
+                        continue
+                    task_id = future.result()[0]
+                self._delete_quietly(task_id)
+
+    def _poll_quietly(self, task_id: int):
+        """Status of a task, or the exception raised while polling it."""
+        try:
+            return self.get_subtitle_task(task_id)
+        except Exception as e:
+            return e
+
+    # asyncio variants, run in worker threads over the shared connection pool
+
+    async def apost_subtitle_task(self, audio, *args, **kwargs) -> Tuple[int, int]:
+        return await asyncio.to_thread(self.post_subtitle_task, audio, *args, **kwargs)
+
+    async def aget_subtitle_task(self, task_id: int) -> int:
+        return await asyncio.to_thread(self.get_subtitle_task, task_id)
+
+    async def aget_url(self, task_id: int) -> str:
+        return await asyncio.to_thread(self.get_url, task_id)
+
+    async def adownload_and_extract_text(self, url: str):
+        return await asyncio.to_thread(self.download_and_extract_text, url)
+
+    async def adelete_task(self, task_id: int):
+        return await asyncio.to_thread(self.delete_task, task_id)
+
+    async def atranscribe(self, audio, *args, **kwargs) -> str:
+        """Transcribe in a worker thread; cancelling the coroutine stops polling."""
+        cancel_event = kwargs.setdefault("cancel_event", threading.Event())
+        try:
+            return await asyncio.to_thread(self.transcribe, audio, *args, **kwargs)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+
 
 bronci_instance = BronciWrapper()
 
 
+def _split_speaker(line: str):
+    """Split a transcript line into its speaker label (if any) and text."""
+    match = SPEAKER_LABEL.match(line)
+    if match:
+        return match.group(1), match.group(2)
+    return "", line
+
+
+def stitch_transcripts(texts: List[str], overlaps: List[bool], min_overlap: int = 2):
+    """Join segment transcripts in order, keeping their speaker labels.
+
+    Where a segment overlaps the previous one (a hard cut without silence),
+    the words heard twice at the boundary are removed from the later one.
+    """
+    lines = []
+    for text, overlaps_previous in zip(texts, overlaps):
+        new_lines = [line for line in text.strip().splitlines() if line.strip()]
+        if overlaps_previous and lines and new_lines:
+            _, previous = _split_speaker(lines[-1])
+            speaker, current = _split_speaker(new_lines[0])
+            for size in range(min(len(previous), len(current)), min_overlap - 1, -1):
+                if previous.endswith(current[:size]):
+                    current = current[size:].lstrip()
+                    break
+            if current:
+                new_lines[0] = speaker + current
+            else:
+                new_lines.pop(0)
+        lines.extend(new_lines)
+    return "\n".join(lines)
+
+
 class AudioToText:
     """
     Interface for converting audio to text here using function calling
@@ -222,9 +517,40 @@ class AudioToText:
         audio_file: bytes,
         audio_type: Literal["wav", "mp3", "m4a", "mp4", "ogg"] = "wav",
     ) -> str:
+        if audio_type != "wav":
+            # Uploaded straight from memory, without a temporary file
+            return bronci_instance.transcribe(
+                memoryview(audio_file), filename=f"audio.{audio_type}"
+            ).strip()
+
+        # Long recordings are split at silence and transcribed in parallel
+        segments = prepare_segments(
+            audio_file,
+            int(os.getenv("BRONCI_SAMPLE_RATE", 8000)),
+            max_seconds=float(os.getenv("ASR_SEGMENT_SECONDS", 60)),
+        )
+        if len(segments) == 1:
+            return self._transcribe_segment(segments[0]).strip()
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(segments), int(os.getenv("ASR_SEGMENT_CONCURRENCY", 16))),
+            thread_name_prefix="asr-segments",
+        ) as executor:
+            texts = list(executor.map(self._transcribe_segment, segments))
+        return stitch_transcripts(
+            texts, [segment.overlaps_previous for segment in segments]
+        ).strip()
+
+    @staticmethod
+    def _transcribe_segment(segment) -> str:
+        return bronci_instance.transcribe(
+            memoryview(segment.data), filename=f"audio.{segment.extension}"
+        )
 
-        with tempfile.NamedTemporaryFile(delete=True, suffix=f".{audio_type}") as tmp:
-            tmp.write(audio_file)
-            tmp.flush()
-            result = bronci_instance.transcribe(tmp.name)
-        return result.strip()
+    def transcribe_files(self, audio_paths: Iterable[str], max_in_flight: int = None):
+        """Transcribe recorded files concurrently, yielding
+        `(audio_path, text, error)` in completion order."""
+        for audio_path, text, error in bronci_instance.transcribe_batch(
+            audio_paths, max_in_flight=max_in_flight
+        ):
+            yield audio_path, text.strip() if text else text, error
@@ -0,0 +1,153 @@
+"""
+Extractive compression of the validated documents before answer generation.
+
+Documents are split into sentences, every sentence is scored against the
+query in one vectorised pass (BM25-style lexical overlap, or cosine
+similarity of sentence embeddings) and the best sentences are kept, in their
+original order, until the token budget is spent.
+"""
+
+import os
+import re
+from typing import List
+
+import numpy as np
+
+from src.tools.models import create_google_embedding
+
+
+# Split after CJK/Latin sentence punctuation and at line breaks
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？；!?;])|(?<=\.)\s+|\n+")
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a document into non-empty sentences."""
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of model tokens in a text.
+
+    CJK characters count as one token each and other words as one token per
+    four characters, which is close enough for budgeting Gemini prompts.
+    """
+    cjk = sum(len(run) for run in _CJK_RUN.findall(text))
+    latin = sum(max(1, len(word) // 4) for word in _WORD.findall(text))
+    return cjk + latin
+
+
+def tokenize(text: str) -> List[str]:
+    """Lexical terms of a text: CJK character bigrams and lowercased words."""
+    terms = []
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    terms.extend(word.lower() for word in _WORD.findall(text))
+    return terms
+
+
+def lexical_scores(
+    query: str, sentences: List[str], k1: float = 1.2, b: float = 0.75
+) -> np.ndarray:
+    """Score sentences against the query with BM25 over the query terms."""
+    vocabulary = {term: i for i, term in enumerate(dict.fromkeys(tokenize(query)))}
+    if not vocabulary or not sentences:
+        return np.zeros(len(sentences))
+
+    rows, cols, lengths = [], [], []
+    for row, sentence in enumerate(sentences):
+        terms = tokenize(sentence)
+        lengths.append(len(terms))
+        for term in terms:
+            col = vocabulary.get(term)
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+
+    counts = np.zeros((len(sentences), len(vocabulary)))
+    np.add.at(counts, (np.array(rows, dtype=int), np.array(cols, dtype=int)), 1)
+
+    lengths = np.array(lengths, dtype=float)
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log1p(
+        (len(sentences) - document_frequency + 0.5) / (document_frequency + 0.5)
+    )
+    norm = 1 - b + b * lengths / max(lengths.mean(), 1.0)
+    weights = counts * (k1 + 1) / (counts + k1 * norm[:, None])
+    return (weights * idf).sum(axis=1)
+
+
+def embedding_scores(query: str, sentences: List[str], embeddings) -> np.ndarray:
+    """Score sentences by the cosine similarity of their embeddings to the query."""
+    if not sentences:
+        return np.zeros(0)
+    query_vector = np.asarray(embeddings.embed_query(query), dtype=float)
+    sentence_vectors = np.asarray(embeddings.embed_documents(sentences), dtype=float)
+    norms = np.linalg.norm(sentence_vectors, axis=1) * np.linalg.norm(query_vector)
+    return sentence_vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+
+
+def compress_documents(
+    query: str,
+    docs: List[str],
+    token_budget: int = None,
+    method: str = None,
+    embeddings=None,
+) -> List[str]:
+    """Keep only the sentences of the documents most similar to the query.
+
+    Args:
+        query (str): The user query.
+        docs (List[str]): The validated documents.
+        token_budget (int, optional): Maximum estimated tokens of the result,
+            defaults to CONTEXT_TOKEN_BUDGET.
+        method (str, optional): "lexical", "embedding" or "off", defaults to
+            CONTEXT_COMPRESSION.
+        embeddings (optional): Embedding model for the "embedding" method.
+
+    Returns:
+        List[str]: The compressed documents, in their original order. Documents
+        left without any selected sentence are dropped.
+    """
+    method = (method or os.getenv("CONTEXT_COMPRESSION", "lexical")).lower()
+    if token_budget is None:
+        token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+    if method == "off" or sum(estimate_tokens(doc) for doc in docs) <= token_budget:
+        return docs
+
+    sentences, owners = [], []
+    for doc_index, doc in enumerate(docs):
+        for sentence in split_sentences(doc):
+            sentences.append(sentence)
+            owners.append(doc_index)
+
+    if method == "embedding":
+        scores = embedding_scores(
+            query, sentences, embeddings or create_google_embedding()
+        )
+    else:
+        scores = lexical_scores(query, sentences)
+
+    # Greedily take the best matching sentences that still fit in the budget,
+    # falling back to the best sentence overall if nothing matches at all
+    ranked = np.argsort(-scores, kind="stable")
+    selected = []
+    remaining = token_budget
+    for index in ranked:
+        cost = estimate_tokens(sentences[index])
+        if scores[index] > 0 and cost <= remaining:
+            selected.append(index)
+            remaining -= cost
+    if not selected and len(ranked):
+        selected.append(ranked[0])
+
+    compressed = []
+    for doc_index in range(len(docs)):
+        kept = [sentences[i] for i in sorted(selected) if owners[i] == doc_index]
+        if kept:
+            compressed.append("\n".join(kept))
+    return compressed
@@ -0,0 +1,215 @@
+"""
+Deterministic offline stand-ins for the Gemini chat and embedding models.
+
+They implement the same LangChain interfaces as the models returned by
+`create_google_model` and `create_google_embedding` (tool calling,
+structured output, embeddings), so the workflows run unchanged without
+network access. Latency, agent decisions and grading verdicts are scripted
+through the class attributes of `FakeBackend`; set LLM_BACKEND=fake to make
+`src.tools.models` return these models. `FakeTranscriber` stands in for the
+speech-to-text call.
+"""
+
+import hashlib
+import itertools
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+class FakeBackendError(RuntimeError):
+    """Error injected by the fake backend."""
+
+
+def sample_latency(spec, rng: random.Random) -> float:
+    """Draw a latency in seconds from a distribution spec.
+
+    Supported specs are ("constant", seconds), ("uniform", low, high),
+    ("normal", mean, stddev) and ("lognormal", median, sigma).
+    """
+    kind, *params = spec
+    if kind == "constant":
+        value = params[0]
+    elif kind == "uniform":
+        value = rng.uniform(params[0], params[1])
+    elif kind == "normal":
+        value = rng.gauss(params[0], params[1])
+    elif kind == "lognormal":
+        value = params[0] * math.exp(rng.gauss(0, params[1])) if params[0] else 0
+    else:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    return max(0.0, value)
+
+
+def parse_latency(text: str):
+    """Parse a latency spec such as "lognormal:0.4:0.3" or "0.2"."""
+    kind, _, rest = text.partition(":")
+    if not rest:
+        return ("constant", float(kind))
+    return (kind, *(float(p) for p in rest.split(":")))
+
+
+class FakeBackend:
+    """Script shared by every fake model instance.
+
+    Like `RedisHandler`'s current key it is class-level state, so the script
+    also applies to models created deep inside the services.
+    """
+
+    # Latency spec per call kind: "chat", "embedding" and "asr"
+    latencies = {
+        "chat": ("constant", 0.0),
+        "embedding": ("constant", 0.0),
+        "asr": ("constant", 0.0),
+    }
+    # Probability per call kind that a call raises FakeBackendError
+    error_rates = {}
+    # "retrieve" to call the retrieve tool, "respond" to answer directly
+    agent_action = "retrieve"
+    # Verdicts returned by the graders, cycled through in order
+    document_verdicts = ("true",)
+    response_verdicts = ("true",)
+    response_text = "這是一個測試回覆。"
+    # Transcripts returned by the fake ASR, cycled through in order
+    transcripts = ("請問忘記密碼要怎麼重設？",)
+
+    _lock = threading.Lock()
+    _rng = random.Random(0)
+    _cycles = {}
+    _simulated = threading.local()
+
+    @classmethod
+    def configure(cls, seed: int = 0, **script):
+        """Replace (part of) the script and restart the verdict cycles."""
+        for name, value in script.items():
+            if not hasattr(cls, name) or name.startswith("_"):
+                raise AttributeError(f"Unknown fake backend setting: {name}")
+            setattr(cls, name, value)
+        with cls._lock:
+            cls._rng = random.Random(seed)
+            cls._cycles = {}
+
+    @classmethod
+    def next_verdict(cls, kind: str) -> str:
+        return cls.next_value(f"{kind}_verdicts")
+
+    @classmethod
+    def next_value(cls, attribute: str):
+        with cls._lock:
+            if attribute not in cls._cycles:
+                cls._cycles[attribute] = itertools.cycle(getattr(cls, attribute))
+            return next(cls._cycles[attribute])
+
+    @classmethod
+    def simulate_call(cls, kind: str):
+        """Sleep for a sampled latency and maybe inject an error."""
+        with cls._lock:
+            delay = sample_latency(cls.latencies.get(kind, ("constant", 0.0)), cls._rng)
+            fail = cls._rng.random() < cls.error_rates.get(kind, 0.0)
+        time.sleep(delay)
+        cls._simulated.seconds = cls.simulated_seconds() + delay
+        if fail:
+            raise FakeBackendError(f"Injected {kind} failure")
+
+    @classmethod
+    def simulated_seconds(cls) -> float:
+        """Total simulated latency slept by the current thread."""
+        return getattr(cls._simulated, "seconds", 0.0)
+
+    @classmethod
+    def reset_simulated_seconds(cls):
+        cls._simulated.seconds = 0.0
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering from the `FakeBackend` script."""
+
+    model: str = "fake-gemini"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-gemini"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        tools: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        FakeBackend.simulate_call("chat")
+        tool_names = [t["function"]["name"] for t in tools or []]
+        query = next(
+            (m.content for m in reversed(messages) if isinstance(m, HumanMessage)), ""
+        )
+
+        if "DocumentGrader" in tool_names or "ResponseGrader" in tool_names:
+            name = tool_names[0]
+            kind = "document" if name == "DocumentGrader" else "response"
+            message = self._tool_call(name, {"binary_score": FakeBackend.next_verdict(kind)})
+        elif "retrieve" in tool_names:
+            if FakeBackend.agent_action == "retrieve":
+                message = self._tool_call("retrieve", {"query": query})
+            else:
+                message = AIMessage(content=FakeBackend.response_text)
+        elif tools:
+            # Any other structured output: fill every field with the response text
+            function = tools[0]["function"]
+            fields = function.get("parameters", {}).get("properties", {})
+            message = self._tool_call(
+                function["name"], {field: FakeBackend.response_text for field in fields}
+            )
+        else:
+            message = AIMessage(content=FakeBackend.response_text)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _tool_call(name: str, args: dict) -> AIMessage:
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": name, "args": args, "id": str(uuid.uuid4())}],
+        )
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic bag-of-characters hashing embeddings."""
+
+    def __init__(self, size: int = 64):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for i in range(max(1, len(text) - 1)):
+            digest = hashlib.md5(text[i : i + 2].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        FakeBackend.simulate_call("embedding")
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        FakeBackend.simulate_call("embedding")
+        return self._embed(text)
+
+
+class FakeTranscriber:
+    """Speech-to-text stand-in returning the scripted transcripts."""
+
+    def __call__(self, audio_file: bytes, *args, **kwargs) -> str:
+        FakeBackend.simulate_call("asr")
+        return FakeBackend.next_value("transcripts")
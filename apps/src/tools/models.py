@@ -1,18 +1,96 @@
 import os
+from functools import lru_cache
+
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 
+from src.tools.fake_models import FakeChatModel, FakeEmbeddings
+from src.utils.metrics import LLMCallCounter
+
+
+# Default model settings of each chain. Every value can be overridden with
+# the {CHAIN}_MODEL, {CHAIN}_TEMPERATURE, {CHAIN}_MAX_TOKENS and
+# {CHAIN}_TIMEOUT environment variables, e.g. GRADER_MODEL. Unset models fall
+# back to GOOGLE_GENERATIVE_MODEL. LLM_BACKEND=fake swaps every model for the
+# offline fakes of `src.tools.fake_models`.
+MODEL_TIERS = {
+    "agent": {},
+    "generator": {},
+    "supervisor": {},
+    "grader": {
+        "model": "gemini-2.0-flash-lite",
+        "temperature": 0.0,
+        "max_tokens": 128,
+        "timeout": 15,
+    },
+    "rewriter": {
+        "model": "gemini-2.0-flash-lite",
+        "temperature": 0.3,
+        "max_tokens": 256,
+        "timeout": 20,
+    },
+    "summarizer": {
+        "model": "gemini-2.0-flash-lite",
+        "temperature": 0.0,
+        "max_tokens": 512,
+        "timeout": 30,
+    },
+}
+
+
+def use_fake_backend() -> bool:
+    return os.getenv("LLM_BACKEND", "google").lower() == "fake"
+
 
 def create_google_embedding():
+    if use_fake_backend():
+        return FakeEmbeddings()
     return GoogleGenerativeAIEmbeddings(
         model=os.getenv("GOOGLE_GENERATIVE_EMBEDDING", "models/text-embedding-004"),
         google_api_key=os.getenv("GOOGLE_API_KEY", ""),
     )
 
 
-def create_google_model():
+def get_model_settings(chain: str = None) -> dict:
+    """Resolve the model, temperature, max output tokens and timeout of a chain."""
+    defaults = MODEL_TIERS.get(chain, {}) if chain else {}
+    prefix = f"{chain.upper()}_" if chain else None
+
+    def setting(name, cast):
+        value = os.getenv(f"{prefix}{name.upper()}") if prefix else None
+        if value in (None, ""):
+            value = defaults.get(name)
+        return cast(value) if value is not None else None
+
+    return {
+        "model": setting("model", str)
+        or os.getenv("GOOGLE_GENERATIVE_MODEL", "gemini-2.0-flash"),
+        "temperature": setting("temperature", float),
+        "max_tokens": setting("max_tokens", int),
+        "timeout": setting("timeout", float),
+    }
+
+
+def create_google_model(chain: str = None):
+    """Create the chat model of the given chain (see `MODEL_TIERS`).
+
+    Chains resolving to the same settings share one client.
+    """
+    settings = get_model_settings(chain)
+    if use_fake_backend():
+        return FakeChatModel(model=settings["model"], callbacks=[LLMCallCounter()])
+    return _create_chat_model(**settings)
+
+
+@lru_cache(maxsize=None)
+def _create_chat_model(model, temperature, max_tokens, timeout):
+    kwargs = {}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
     return ChatGoogleGenerativeAI(
-        model=os.getenv("GOOGLE_GENERATIVE_MODEL", "gemini-2.0-flash"),
+        model=model,
         google_api_key=os.getenv("GOOGLE_API_KEY", ""),
-        max_tokens=None,
-        timeout=None,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        callbacks=[LLMCallCounter()],
+        **kwargs,
     )
@@ -2,6 +2,8 @@ from src.services.prompts import (
     RETRIEVAL_SYSTEM_PROMPT,
     QUERY_REWRITE_PROMPT,
     SUPERVISOR_PROMPT,
+    SUPERVISOR_TURN_PROMPT,
+    SUPERVISOR_SYNTHESIS_PROMPT,
 )
 
 
@@ -23,6 +25,31 @@ def create_scenarios_supervisor_prompt(scenarios_description, instructions):
     )
 
 
+def create_supervisor_turn_prompt(scenarios_description, instructions):
+    """
+    Create a prompt for the supervisor agent assessing the newest turns of a running conversation.
+    """
+    return SUPERVISOR_TURN_PROMPT.format(
+        scenarios=scenarios_description,
+        instructions=instructions,
+        summary="{summary}",
+        turns="{turns}",
+    )
+
+
+def create_supervisor_synthesis_prompt(scenarios_description, instructions):
+    """
+    Create a prompt for the supervisor agent synthesising the final feedback from the turn assessments.
+    """
+    return SUPERVISOR_SYNTHESIS_PROMPT.format(
+        scenarios=scenarios_description,
+        instructions=instructions,
+        summary="{summary}",
+        assessments="{assessments}",
+        remaining_turns="{remaining_turns}",
+    )
+
+
 def create_query_rewrite_prompt(scenarios_description):
     """
     Create a prompt for the query rewrite agent based on the provided scenario description.
@@ -1,6 +1,13 @@
 import logging
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from src.utils.log_handler import setup_logger
 from src.utils.redis_handler import RedisHandler
+from src.utils.metrics import record_cache_lookup, track_stage
+from src.tools.compression import tokenize
 from src.tools.models import create_google_embedding
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_community.vectorstores import FAISS
@@ -9,6 +16,9 @@ from typing import List, Union
 from langchain_community.document_loaders import PyPDFLoader
 
 
+logger = setup_logger(__name__)
+
+
 def check_directory_exists(key: str) -> bool:
     """Check if a directory exists.
 
@@ -75,33 +85,110 @@ def create_index_with_file_objects(key, file_objects):
     print(f"Vector store saved to {save_path}")
 
 
-@tool("retrieve", return_direct=True)
-def retrieve(query: str) -> Union[List[str] | str]:
-    """Retrieve relevant documents from the vector store based on the query.
-    Args:
-        query (str): The search query.
-    Returns:
-        List[str]: A list of relevant document contents.
-    """
-    if RedisHandler.get_current_key is None:
-        raise ValueError(
-            "No vector store key found. Please create a vector store first."
-        )
-
-    vectorstore = FAISS.load_local(
-        os.path.join(
-            os.getenv("VECTORSTORE_PATH", "fixtures/vector_db"),
-            RedisHandler.get_current_key(),
-        ),
-        create_google_embedding(),
-        allow_dangerous_deserialization=True,
+def load_vector_store(key: str) -> FAISS:
+    """Load a saved index once; indexes are never rewritten under a key."""
+    return _load_vector_store(
+        os.path.join(os.getenv("VECTORSTORE_PATH", "fixtures/vector_db"), key)
     )
 
-    retriever = vectorstore.as_retriever(
-        search_kwargs={"k": int(os.getenv("RETRIEVAL_NUMBER", 3))}
+
+@lru_cache(maxsize=8)
+def _load_vector_store(path: str) -> FAISS:
+    return FAISS.load_local(
+        path, create_google_embedding(), allow_dangerous_deserialization=True
     )
 
+
+def search(key: str, query: str) -> Union[List[str] | str]:
+    retriever = load_vector_store(key).as_retriever(
+        search_kwargs={"k": int(os.getenv("RETRIEVAL_NUMBER", 3))}
+    )
     docs = retriever.get_relevant_documents(query)
     if not docs:
         return "No relevant documents found."
     return [doc.page_content for doc in docs]
+
+
+def _normalise(query: str) -> str:
+    return query.strip().strip("。？！?!.,，、 ").lower()
+
+
+class RetrievalPrefetcher:
+    """Speculative retrieval for queries that are about to be asked.
+
+    While a voice turn is still being transcribed, `prefetch` starts
+    embedding and searching the transcript so far in the background. When
+    the agent then calls `retrieve`, a prefetched search is reused if its
+    text is the query, or shares at least `min_overlap` of its terms with
+    it; otherwise the search runs as usual.
+    """
+
+    def __init__(self, max_entries: int = 64, min_overlap: float = None):
+        if min_overlap is None:
+            min_overlap = float(os.getenv("RETRIEVAL_PREFETCH_MIN_OVERLAP", 0.8))
+        self.max_entries = max_entries
+        self.min_overlap = min_overlap
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prefetch(self, query: str):
+        vector_key = RedisHandler.get_current_key()
+        if vector_key is None or not _normalise(query):
+            return
+        key = (vector_key, _normalise(query))
+        with self._lock:
+            if key in self._futures:
+                return
+            self._futures[key] = _prefetch_executor.submit(search, vector_key, query)
+            while len(self._futures) > self.max_entries:
+                self._futures.popitem(last=False)
+
+    def lookup(self, vector_key: str, query: str):
+        """The prefetched result matching the query, waiting for it if needed."""
+        normalised = _normalise(query)
+        terms = set(tokenize(normalised))
+        with self._lock:
+            future = self._futures.get((vector_key, normalised))
+            if future is None and terms:
+                # The most recent prefetch covering the agent's wording
+                for (prefetched_key, text), candidate in reversed(self._futures.items()):
+                    prefetched_terms = set(tokenize(text))
+                    overlap = len(terms & prefetched_terms) / len(
+                        terms | prefetched_terms
+                    )
+                    if prefetched_key == vector_key and overlap >= self.min_overlap:
+                        future = candidate
+                        break
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logger.warning("Prefetched retrieval failed: %s", e)
+            return None
+
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+prefetcher = RetrievalPrefetcher()
+
+
+@tool("retrieve", return_direct=True)
+def retrieve(query: str) -> Union[List[str] | str]:
+    """Retrieve relevant documents from the vector store based on the query.
+    Args:
+        query (str): The search query.
+    Returns:
+        List[str]: A list of relevant document contents.
+    """
+    with track_stage("retrieval", "retrieve"):
+        vector_key = RedisHandler.get_current_key()
+        if vector_key is None:
+            raise ValueError(
+                "No vector store key found. Please create a vector store first."
+            )
+
+        prefetched = prefetcher.lookup(vector_key, query)
+        record_cache_lookup("retrieval_prefetch", prefetched is not None)
+        if prefetched is not None:
+            return prefetched
+        return search(vector_key, query)
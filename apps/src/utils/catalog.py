@@ -0,0 +1,201 @@
+"""
+Catalog of the named entries of a namespace (scenarios, knowledge bases,
+supervisor instructions).
+
+Entry names are kept in an index set next to the entries, maintained on every
+create and delete, so listing them reads the set with SSCAN instead of
+running KEYS over the whole database. The entries already in the database
+are indexed once, before the first read or write, and a marker key records
+that the index is complete (the set itself disappears with its last name).
+
+The list is cached in process and only read again when a writer in any
+process publishes an invalidation, which makes rendering the selectors free
+of round-trips in the steady state.
+"""
+
+import threading
+import time
+from functools import lru_cache
+from typing import List, Sequence
+
+from redis import Redis, RedisError
+
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import record_cache_lookup
+from src.utils.data_access import NAMESPACES, get_redis
+from src.utils.redis_handler import RedisHandler
+
+
+logger = setup_logger(__name__)
+
+INVALIDATION_CHANNEL = "catalog:invalidate"
+
+
+class Catalog(RedisHandler):
+    """`RedisHandler` over an indexed, cached list of entry names.
+
+    The cache is also refreshed after `max_age` seconds, and whenever the
+    invalidation subscription drops, since messages may have been missed.
+    """
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        namespace: str,
+        prefix: str = "",
+        max_age: float = 300,
+    ):
+        super().__init__(redis_connection, prefix)
+        self.namespace = namespace
+        self.index_key = f"catalog:{namespace}"
+        self.indexed_key = f"catalog:{namespace}:indexed"
+        self._indexed = False
+        self.max_age = max_age
+        self._names = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._subscribe()
+
+    def _subscribe(self):
+        try:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_message})
+            self._listener = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=self._on_listener_error
+            )
+        except RedisError as e:
+            # Without invalidations the cache still expires after max_age
+            logger.warning("Catalog %s is not notified of changes: %s", self.namespace, e)
+
+    def _on_message(self, message):
+        if message["data"] == self.namespace:
+            self.invalidate()
+
+    def _on_listener_error(self, error, pubsub, thread):
+        logger.warning("Catalog %s lost its subscription: %s", self.namespace, error)
+        self.invalidate()
+        thread.stop()
+        pubsub.close()
+        self._subscribe()
+
+    def invalidate(self):
+        with self._lock:
+            self._names = None
+            self._generation += 1
+
+    def _publish(self):
+        self.invalidate()
+        self.redis_client.publish(INVALIDATION_CHANNEL, self.namespace)
+
+    def cached_keys(self):
+        """The cached entry names, or None with the cache generation when they
+        have to be read again."""
+        with self._lock:
+            names = self._names
+            if names is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return names, self._generation
+            return None, self._generation
+
+    def get_all_keys(self) -> List[str]:
+        """The sorted entry names, from the in-process cache when it is valid."""
+        names, generation = self.cached_keys()
+        record_cache_lookup("catalog", names is not None)
+        if names is not None:
+            return names
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.sscan(self.index_key, 0, count=1000)
+        pipeline.exists(self.indexed_key)
+        first_page, indexed = pipeline.execute()
+        return self._load(first_page, generation, indexed)
+
+    def _load(self, first_page, generation: int, indexed: bool) -> List[str]:
+        """Finish reading the index from the first page of its SSCAN, or
+        build it when the `indexed` marker was not set."""
+        if not indexed:
+            names = self.rebuild_index()
+        else:
+            self._indexed = True
+            cursor, names = first_page
+            names = set(names)
+            while cursor:
+                cursor, page = self.redis_client.sscan(self.index_key, cursor, count=1000)
+                names.update(page)
+            names = sorted(names)
+        with self._lock:
+            # Unless it was invalidated while being read
+            if self._generation == generation:
+                self._names = names
+                self._loaded_at = time.monotonic()
+        return names
+
+    def rebuild_index(self) -> List[str]:
+        """Index the entries already in the database (SCAN, not KEYS) and
+        mark the index as complete."""
+        names = sorted(
+            key[len(self.prefix) :]
+            for key in self.redis_client.scan_iter(
+                match=self.prefix + "*", count=500, _type="string"
+            )
+        )
+        pipeline = self.redis_client.pipeline()
+        if names:
+            pipeline.sadd(self.index_key, *names)
+        pipeline.set(self.indexed_key, 1)
+        pipeline.execute()
+        self._indexed = True
+        logger.info("Indexed %s existing %s entries", len(names), self.namespace)
+        return names
+
+    def _ensure_indexed(self):
+        """Index the existing entries before the index is first written to."""
+        if not self._indexed and not self.redis_client.exists(self.indexed_key):
+            self.rebuild_index()
+        self._indexed = True
+
+    def set_value(self, key, value):
+        self._ensure_indexed()
+        pipeline = self.redis_client.pipeline()
+        pipeline.set(self.prefix + key, value)
+        pipeline.sadd(self.index_key, key)
+        stored, added = pipeline.execute()
+        if added:
+            self._publish()
+        return stored
+
+    def delete_value(self, key):
+        self._ensure_indexed()
+        pipeline = self.redis_client.pipeline()
+        pipeline.delete(self.prefix + key)
+        pipeline.srem(self.index_key, key)
+        deleted, _ = pipeline.execute()
+        self._publish()
+        return deleted > 0
+
+    delete_key = delete_value
+
+
+@lru_cache(maxsize=None)
+def get_catalog(namespace: str) -> Catalog:
+    """The process-wide catalog of a namespace, shared by all page sessions."""
+    return Catalog(get_redis(), namespace, prefix=NAMESPACES[namespace])
+
+
+def load_catalogs(catalogs: Sequence[Catalog]):
+    """Refresh the catalogs whose cache is not valid in one round-trip, so
+    that a page listing several of them only waits for Redis once."""
+    stale = []
+    for catalog in catalogs:
+        names, generation = catalog.cached_keys()
+        if names is None:
+            stale.append((catalog, generation))
+    if not stale:
+        return
+    pipeline = stale[0][0].redis_client.pipeline(transaction=False)
+    for catalog, _ in stale:
+        pipeline.sscan(catalog.index_key, 0, count=1000)
+        pipeline.exists(catalog.indexed_key)
+    responses = pipeline.execute()
+    for i, (catalog, generation) in enumerate(stale):
+        catalog._load(responses[2 * i], generation, responses[2 * i + 1])
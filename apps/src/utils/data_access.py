@@ -0,0 +1,203 @@
+"""
+Shared, pooled access to Redis.
+
+Every feature uses the clients of this module, which share one connection
+pool to one database (REDIS_DB). Features keep their keys apart with
+prefixes rather than database numbers: the catalogued entries use the
+`NAMESPACES` prefixes, the other stores prefix their own keys ("feedback:",
+"transcript:", "session:", "job:", "chat_memory:", ...).
+`scripts/migrate_redis_namespaces.py` moves the data of the former
+per-feature databases.
+
+Clients count their round-trips in `redis_round_trips_total`, per workflow
+stage, and `count_round_trips` counts those of a block of code. `get_many`
+reads keys of several namespaces in a single MGET. `get_async_redis` is the
+`redis.asyncio` counterpart of `get_redis`.
+"""
+
+import asyncio
+import os
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import redis.asyncio
+from redis import BlockingConnectionPool, ConnectionPool, Redis
+from redis.client import Pipeline
+
+from src.utils.metrics import record_redis_round_trip
+from src.utils.redis_handler import RedisHandler, get_fake_server, use_fake_redis
+
+
+# Key prefix of each namespace of named entries
+NAMESPACES = {
+    "scenarios": "scenario:",
+    "knowledge_bases": "knowledge_base:",
+    "supervisor": "supervisor:",
+}
+
+
+class RoundTrips:
+    """Number of round-trips made inside a `count_round_trips` block."""
+
+    def __init__(self):
+        self.count = 0
+
+
+_round_trips = ContextVar("redis_round_trips", default=None)
+
+
+@contextmanager
+def count_round_trips() -> Iterator[RoundTrips]:
+    """Count the round-trips to Redis made by this thread inside the block,
+    e.g. by a page render."""
+    counter = RoundTrips()
+    token = _round_trips.set(counter)
+    try:
+        yield counter
+    finally:
+        _round_trips.reset(token)
+
+
+def _record(kind: str):
+    record_redis_round_trip(kind)
+    counter = _round_trips.get()
+    if counter is not None:
+        counter.count += 1
+
+
+class CountingPipeline(Pipeline):
+    def execute(self, raise_on_error: bool = True):
+        if self.command_stack:
+            _record("pipeline")
+        return super().execute(raise_on_error)
+
+
+class CountingRedis(Redis):
+    """Redis client counting its round-trips; a pipeline counts as one."""
+
+    def execute_command(self, *args, **options):
+        _record("command")
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> CountingPipeline:
+        return CountingPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+class AsyncCountingPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        if self.command_stack:
+            _record("pipeline")
+        return await super().execute(raise_on_error)
+
+
+class AsyncCountingRedis(redis.asyncio.Redis):
+    """`redis.asyncio` client counting its round-trips."""
+
+    async def execute_command(self, *args, **options):
+        _record("command")
+        return await super().execute_command(*args, **options)
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint=None
+    ) -> AsyncCountingPipeline:
+        return AsyncCountingPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+def _pool_settings() -> dict:
+    return {
+        "db": int(os.getenv("REDIS_DB", 0)),
+        "decode_responses": True,  # Automatically decode response bytes to strings
+    }
+
+
+def _server_settings() -> dict:
+    return {
+        "host": os.getenv("REDIS_HOST", "localhost"),
+        "port": int(os.getenv("REDIS_PORT", 6379)),
+        "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", 64)),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_connection_pool() -> ConnectionPool:
+    """The process-wide pool; callers wait up to REDIS_POOL_TIMEOUT seconds
+    for a connection when all REDIS_MAX_CONNECTIONS are in use."""
+    if use_fake_redis():
+        import fakeredis
+
+        return ConnectionPool(
+            connection_class=fakeredis.FakeConnection,
+            server=get_fake_server(),
+            **_pool_settings(),
+        )
+    return BlockingConnectionPool(
+        timeout=float(os.getenv("REDIS_POOL_TIMEOUT", 5)),
+        **_server_settings(),
+        **_pool_settings(),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_redis() -> CountingRedis:
+    """The shared Redis client."""
+    return CountingRedis(connection_pool=get_connection_pool())
+
+
+# asyncio connections belong to the event loop they were opened in
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> AsyncCountingRedis:
+    """The shared `redis.asyncio` client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        if use_fake_redis():
+            import fakeredis
+
+            pool = redis.asyncio.ConnectionPool(
+                connection_class=fakeredis.FakeAsyncConnection,
+                server=get_fake_server(),
+                **_pool_settings(),
+            )
+        else:
+            pool = redis.asyncio.BlockingConnectionPool(
+                timeout=float(os.getenv("REDIS_POOL_TIMEOUT", 5)),
+                **_server_settings(),
+                **_pool_settings(),
+            )
+        client = AsyncCountingRedis(connection_pool=pool)
+        _async_clients[loop] = client
+    return client
+
+
+def key(namespace: str, name: str) -> str:
+    """The Redis key of a named entry of a namespace."""
+    return NAMESPACES[namespace] + name
+
+
+def get_handler(namespace: str) -> RedisHandler:
+    """A `RedisHandler` over the entries of a namespace."""
+    return RedisHandler(get_redis(), prefix=NAMESPACES[namespace])
+
+
+def get_many(entries: Sequence[Tuple[str, str]]) -> List[Optional[str]]:
+    """Read (namespace, name) entries in one round-trip, None for missing ones."""
+    if not entries:
+        return []
+    return get_redis().mget([key(namespace, name) for namespace, name in entries])
+
+
+async def aget_many(entries: Sequence[Tuple[str, str]]) -> List[Optional[str]]:
+    if not entries:
+        return []
+    return await get_async_redis().mget(
+        [key(namespace, name) for namespace, name in entries]
+    )
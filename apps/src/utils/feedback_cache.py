@@ -0,0 +1,65 @@
+"""
+Memoisation of supervisor feedback.
+
+Feedback is keyed by a digest of the transcript, the scenario and the
+supervisor instructions, so reruns of the time-up page reuse the result
+instead of calling the LLM again, and a refreshed page can read it back
+from Redis.
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from redis import Redis, RedisError
+
+from src.utils.log_handler import setup_logger
+
+
+logger = setup_logger(__name__)
+
+
+def transcript_digest(
+    messages: List[Dict], scenarios_key: str, supervisor_instructions: str
+) -> str:
+    """Digest identifying a feedback request."""
+    payload = json.dumps(
+        {
+            "messages": [[m["role"], m["content"]] for m in messages],
+            "scenario": scenarios_key,
+            "instructions": supervisor_instructions,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FeedbackStore:
+    """Supervisor feedback persisted in Redis by transcript digest."""
+
+    def __init__(
+        self, redis_connection: Redis, ttl: int = 7 * 86400, prefix: str = "feedback:"
+    ):
+        self.redis_client = redis_connection
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, digest: str) -> Optional[str]:
+        try:
+            return self.redis_client.get(self.prefix + digest)
+        except RedisError as e:
+            logger.warning("Failed to read cached feedback: %s", e)
+            return None
+
+    def set(self, digest: str, feedback: str):
+        try:
+            self.redis_client.set(self.prefix + digest, feedback, ex=self.ttl)
+        except RedisError as e:
+            logger.warning("Failed to cache feedback: %s", e)
+
+    def delete(self, digest: str):
+        try:
+            self.redis_client.delete(self.prefix + digest)
+        except RedisError as e:
+            logger.warning("Failed to delete cached feedback: %s", e)
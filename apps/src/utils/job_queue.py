@@ -0,0 +1,243 @@
+"""
+Redis stream job queue for chat turns and evaluations.
+
+The Streamlit page submits jobs and waits for their results, while any
+number of worker processes (`worker.py`) consume them through a consumer
+group. Delivery is at-least-once: a job is acknowledged only after its
+result is stored, and deleted from the stream with its acknowledgement so
+the stream only holds unfinished jobs. A failing job is put back on the stream straight away,
+after a short backoff, and jobs left unacknowledged by a crashed worker are
+claimed again after the visibility timeout. Job ids are idempotency keys:
+submitting an id twice enqueues it once, and a job whose result already
+exists is acknowledged without running it again.
+"""
+
+import json
+import os
+import time
+import uuid
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from redis import Redis, ResponseError
+
+from src.utils.log_handler import setup_logger
+from src.utils.data_access import get_redis
+
+
+logger = setup_logger(__name__)
+
+
+class JobFailed(RuntimeError):
+    """The job failed on every delivery."""
+
+
+class JobQueue:
+    """Submit, wait for and consume jobs on a Redis stream."""
+
+    def __init__(
+        self,
+        redis_connection: Redis,
+        stream: str = "jobs",
+        group: str = "workers",
+        result_ttl: int = 3600,
+        visibility_timeout: float = 60,
+        max_deliveries: int = 3,
+        retry_backoff: float = 1.0,
+        wait_timeout: float = 120,
+    ):
+        self.redis_client = redis_connection
+        self.stream = stream
+        self.group = group
+        self.result_ttl = result_ttl
+        self.visibility_timeout = visibility_timeout
+        self.max_deliveries = max_deliveries
+        self.retry_backoff = retry_backoff
+        self.wait_timeout = wait_timeout
+        if visibility_timeout >= wait_timeout:
+            raise ValueError(
+                f"Jobs of crashed workers are claimed again after "
+                f"{visibility_timeout:.0f} s, not within the {wait_timeout:.0f} s "
+                f"waited for their result"
+            )
+        if self.retry_delay(max_deliveries) >= wait_timeout:
+            raise ValueError(
+                f"Retrying a job {max_deliveries - 1} times takes at least "
+                f"{self.retry_delay(max_deliveries):.0f} s, more than the "
+                f"{wait_timeout:.0f} s waited for its result"
+            )
+
+    def backoff(self, delivery: int) -> float:
+        """Pause before putting a job back after its `delivery`-th failure."""
+        return self.retry_backoff * 2 ** (delivery - 1)
+
+    def retry_delay(self, deliveries: int) -> float:
+        """Total backoff of a job failing its first `deliveries - 1` deliveries."""
+        return sum(self.backoff(delivery) for delivery in range(1, deliveries))
+
+    def _key(self, job_id: str, field: str) -> str:
+        return f"job:{job_id}:{field}"
+
+    # Producer side
+
+    def submit(self, kind: str, payload: dict, job_id: str = None) -> str:
+        """Enqueue a job unless one with the same id was already submitted."""
+        job_id = job_id or str(uuid.uuid4())
+        if self.redis_client.set(
+            self._key(job_id, "state"), "queued", nx=True, ex=self.result_ttl
+        ):
+            self.redis_client.xadd(
+                self.stream, self._fields(job_id, kind, payload, delivery=1)
+            )
+        return job_id
+
+    @staticmethod
+    def _fields(job_id: str, kind: str, payload: dict, delivery: int) -> dict:
+        return {
+            "id": job_id,
+            "kind": kind,
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "delivery": delivery,
+        }
+
+    def get_result(self, job_id: str) -> Optional[dict]:
+        """The result of a finished job, or None while it is pending."""
+        value = self.redis_client.get(self._key(job_id, "result"))
+        if value is None:
+            return None
+        result = json.loads(value)
+        if "error" in result:
+            raise JobFailed(result["error"])
+        return result
+
+    def wait(self, job_id: str, timeout: float = None) -> dict:
+        """Block until the job has a result, at most `wait_timeout` by default."""
+        timeout = timeout or self.wait_timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            result = self.get_result(job_id)
+            if result is not None:
+                return result
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Job {job_id} did not finish in {timeout} s")
+            # Woken up by the worker as soon as the result is stored
+            self.redis_client.blpop(self._key(job_id, "done"), timeout=min(remaining, 1))
+
+    def forget(self, job_id: str):
+        """Drop a job's state and result so that its id can be submitted again."""
+        self.redis_client.delete(
+            self._key(job_id, "state"),
+            self._key(job_id, "result"),
+            self._key(job_id, "done"),
+        )
+
+    # Worker side
+
+    def ensure_group(self):
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def claim(self, consumer: str, block: float = 5) -> Optional[Tuple[str, dict]]:
+        """Take the next job: one abandoned by another worker, or a new one."""
+        _, messages, *_ = self.redis_client.xautoclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=int(self.visibility_timeout * 1000),
+            start_id="0-0",
+            count=1,
+        )
+        if not messages:
+            response = self.redis_client.xreadgroup(
+                self.group, consumer, {self.stream: ">"}, count=1, block=int(block * 1000)
+            )
+            messages = response[0][1] if response else []
+        if not messages:
+            return None
+        message_id, fields = messages[0]
+        return message_id, {
+            "id": fields["id"],
+            "kind": fields["kind"],
+            "payload": json.loads(fields["payload"]),
+            "delivery": int(fields.get("delivery", 1)),
+        }
+
+    def is_done(self, job_id: str) -> bool:
+        return self.redis_client.exists(self._key(job_id, "result")) > 0
+
+    def complete(self, message_id: str, job_id: str, result: dict):
+        """Store the result, wake up the waiters and acknowledge the message."""
+        pipeline = self.redis_client.pipeline()
+        pipeline.set(
+            self._key(job_id, "result"),
+            json.dumps(result, ensure_ascii=False),
+            ex=self.result_ttl,
+        )
+        pipeline.set(self._key(job_id, "state"), "done", ex=self.result_ttl)
+        pipeline.rpush(self._key(job_id, "done"), 1)
+        pipeline.expire(self._key(job_id, "done"), self.result_ttl)
+        self._remove(pipeline, message_id)
+        pipeline.execute()
+
+    def acknowledge(self, message_id: str):
+        pipeline = self.redis_client.pipeline()
+        self._remove(pipeline, message_id)
+        pipeline.execute()
+
+    def _remove(self, pipeline, message_id: str):
+        """Acknowledge the message and drop it and its payload from the stream."""
+        pipeline.xack(self.stream, self.group, message_id)
+        pipeline.xdel(self.stream, message_id)
+
+    def fail(self, message_id: str, job: dict, error: Exception):
+        """Put a failed job back on the stream after a backoff, or give up
+        after `max_deliveries` and store the error as its result."""
+        # Deliveries of this message to workers that crashed count too
+        pending = self.redis_client.xpending_range(
+            self.stream, self.group, min=message_id, max=message_id, count=1
+        )
+        redeliveries = pending[0]["times_delivered"] - 1 if pending else 0
+        delivery = job["delivery"] + redeliveries
+        if delivery >= self.max_deliveries:
+            logger.error("Job %s failed %s times, giving up: %s", job["id"], delivery, error)
+            self.complete(message_id, job["id"], {"error": str(error)})
+            return
+
+        logger.warning(
+            "Job %s failed (delivery %s), retrying in %.1f s: %s",
+            job["id"],
+            delivery,
+            self.backoff(delivery),
+            error,
+        )
+        time.sleep(self.backoff(delivery))
+        pipeline = self.redis_client.pipeline()
+        pipeline.xadd(
+            self.stream,
+            self._fields(job["id"], job["kind"], job["payload"], delivery + 1),
+        )
+        self._remove(pipeline, message_id)
+        pipeline.execute()
+
+
+@lru_cache(maxsize=1)
+def get_job_queue() -> JobQueue:
+    """Return the queue shared by the page and the workers.
+
+    Configured with JOB_RESULT_TTL, JOB_VISIBILITY_TIMEOUT,
+    JOB_MAX_DELIVERIES, JOB_RETRY_BACKOFF and JOB_WAIT_TIMEOUT; raises
+    ValueError if a crashed or failing job cannot be run again within the
+    wait timeout.
+    """
+    return JobQueue(
+        get_redis(),
+        result_ttl=int(os.getenv("JOB_RESULT_TTL", 3600)),
+        visibility_timeout=float(os.getenv("JOB_VISIBILITY_TIMEOUT", 60)),
+        max_deliveries=int(os.getenv("JOB_MAX_DELIVERIES", 3)),
+        retry_backoff=float(os.getenv("JOB_RETRY_BACKOFF", 1.0)),
+        wait_timeout=float(os.getenv("JOB_WAIT_TIMEOUT", 120)),
+    )
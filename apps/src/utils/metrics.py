@@ -0,0 +1,349 @@
+"""
+In-process latency and call-count metrics for the chatbot workflows.
+
+Every stage (a LangGraph node, the retrieve tool, the ASR call) records its
+latency into a histogram, and LLM calls, Redis round-trips, retries and
+cache lookups are counted. The registry can be scraped in Prometheus text
+format from a local HTTP endpoint or dumped to a file.
+"""
+
+import atexit
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.utils.log_handler import setup_logger
+
+
+logger = setup_logger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+STAGE_LATENCY = "workflow_stage_latency_seconds"
+STAGE_ERRORS = "workflow_stage_errors_total"
+LLM_CALLS = "llm_calls_total"
+RETRIES = "workflow_retries_total"
+CACHE_LOOKUPS = "cache_lookups_total"
+ASR_AUDIO_SECONDS = "asr_audio_seconds"
+REDIS_ROUND_TRIPS = "redis_round_trips_total"
+
+# The stage currently running in this context, used to attribute LLM calls
+_current_stage = contextvars.ContextVar("current_stage", default=("", ""))
+
+
+class Histogram:
+    """A cumulative-bucket histogram which also keeps a window of recent
+    samples so that exact quantiles can be reported."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_samples: int = 2048):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def quantile(self, q: float) -> float:
+        """Return the q-quantile of the recent samples (nearest rank)."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+        return ordered[index]
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms and counters keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get_counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def counters(self, name: str) -> dict:
+        """Return the values of every series of a counter, keyed like `summary`."""
+        with self._lock:
+            return {
+                "/".join(value for _, value in _ordered(labels)): value
+                for (metric, labels), value in self._counters.items()
+                if metric == name
+            }
+
+    def summary(self, name: str = STAGE_LATENCY) -> dict:
+        """Return count, mean and p50/p95/p99 for every series of a histogram.
+
+        The result is keyed by the label values joined with "/", e.g.
+        "self_rag/validate_docs".
+        """
+        result = {}
+        with self._lock:
+            for (metric, labels), histogram in self._histograms.items():
+                if metric != name:
+                    continue
+                series = "/".join(value for _, value in _ordered(labels))
+                result[series] = {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count if histogram.count else 0,
+                    **{f"p{int(q * 100)}": histogram.quantile(q) for q in QUANTILES},
+                }
+        return result
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                bucket_labels = labels + (("le", _format_value(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {count}")
+            inf_labels = labels + (("le", "+Inf"),)
+            lines.append(f"{name}_bucket{_format_labels(inf_labels)} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        # Recent-window quantiles are exported as a separate summary metric
+        seen = set()
+        for (name, labels), histogram in histograms:
+            summary_name = f"{name}_recent"
+            if summary_name not in seen:
+                seen.add(summary_name)
+                lines.append(f"# TYPE {summary_name} summary")
+            for q in QUANTILES:
+                quantile_labels = labels + (("quantile", _format_value(q)),)
+                lines.append(
+                    f"{summary_name}{_format_labels(quantile_labels)} "
+                    f"{histogram.quantile(q)}"
+                )
+            window = list(histogram.samples)
+            lines.append(f"{summary_name}_sum{_format_labels(labels)} {sum(window)}")
+            lines.append(f"{summary_name}_count{_format_labels(labels)} {len(window)}")
+
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Write the current metrics to a file in Prometheus text format."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        logger.info("Metrics dumped to %s", path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+def _ordered(labels):
+    """Order labels with the workflow first, then by name."""
+    return sorted(labels, key=lambda kv: (kv[0] != "workflow", kv[0]))
+
+
+def _format_value(value) -> str:
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def track_stage(workflow: str, stage: str):
+    """Time a block of code as a stage of the given workflow.
+
+    LLM calls made inside the block are attributed to the stage.
+    """
+    token = _current_stage.set((workflow, stage))
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        registry.increment(STAGE_ERRORS, workflow=workflow, stage=stage)
+        raise
+    finally:
+        registry.observe(
+            STAGE_LATENCY, time.perf_counter() - start, workflow=workflow, stage=stage
+        )
+        _current_stage.reset(token)
+
+
+def instrument(workflow: str, stage: str = None):
+    """Decorator form of `track_stage`, defaulting the stage to the function name."""
+
+    def decorator(func):
+        stage_name = stage or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_stage(workflow, stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_retry(workflow: str, kind: str):
+    """Count a retry (regeneration, re-retrieval, ...) of a workflow."""
+    registry.increment(RETRIES, workflow=workflow, kind=kind)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a hit or miss of one of the application caches."""
+    registry.increment(CACHE_LOOKUPS, cache=cache, result="hit" if hit else "miss")
+
+
+def record_redis_round_trip(kind: str):
+    """Count a command or pipeline sent to Redis, attributed to the current stage."""
+    workflow, stage = _current_stage.get()
+    registry.increment(
+        REDIS_ROUND_TRIPS, kind=kind, workflow=workflow or "none", stage=stage or "none"
+    )
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """LangChain callback counting model calls per workflow stage."""
+
+    def _record(self):
+        workflow, stage = _current_stage.get()
+        registry.increment(
+            LLM_CALLS, workflow=workflow or "none", stage=stage or "none"
+        )
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._record()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._record()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_configured = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """Serve the metrics on http://host:port/metrics from a daemon thread.
+
+    Calling it again once the server is running returns the running server,
+    so it is safe on Streamlit reruns.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+            thread = threading.Thread(target=_server.serve_forever, daemon=True)
+            thread.start()
+            logger.info("Metrics endpoint listening on http://%s:%s/metrics", host, port)
+    return _server
+
+
+def configure_metrics():
+    """Set up metrics export from the environment, once per process.
+
+    METRICS_PORT starts the local Prometheus endpoint (bound to METRICS_HOST)
+    and METRICS_DUMP_PATH writes the metrics to a file when the process exits.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    port = int(os.getenv("METRICS_PORT", "0") or 0)
+    if port:
+        start_metrics_server(port, os.getenv("METRICS_HOST", "127.0.0.1"))
+
+    dump_path = os.getenv("METRICS_DUMP_PATH")
+    if dump_path:
+        atexit.register(registry.dump, dump_path)
@@ -1,27 +1,79 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from redis import Redis
 
 
+# Retrieval key of the current thread or task, overriding the shared one
+_retrieval_key = ContextVar("retrieval_key", default=None)
+
+_fake_server = None
+
+
+def get_fake_server():
+    """The in-process fakeredis server used when REDIS_BACKEND=fake."""
+    global _fake_server
+    # Optional dependency, only needed for local runs
+    import fakeredis
+
+    if _fake_server is None:
+        _fake_server = fakeredis.FakeServer()
+    return _fake_server
+
+
+def use_fake_redis() -> bool:
+    return os.getenv("REDIS_BACKEND", "redis") == "fake"
+
+
+def create_redis_connection(db: int = 0) -> Redis:
+    """Create a Redis client for the given database of the configured server.
+
+    With REDIS_BACKEND=fake, clients share an in-process fakeredis server
+    instead, so that the app, the workers and the scripts can run without
+    a Redis server. The application itself uses the shared pool of
+    `src.utils.data_access`; this is for direct access to other databases.
+    """
+    if use_fake_redis():
+        import fakeredis
+
+        return fakeredis.FakeRedis(server=get_fake_server(), db=db, decode_responses=True)
+    return Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=db,
+        decode_responses=True,  # Automatically decode response bytes to strings
+    )
+
+
 class RedisHandler:
 
     # Class attribute shared by all instances
     current_retrieval_key = None
     current_supervisor_key = None
 
-    def __init__(self, redis_connection: Redis):
+    def __init__(self, redis_connection: Redis, prefix: str = ""):
         self.redis_client = redis_connection
+        # Namespace of the keys handled, see `src.utils.data_access.NAMESPACES`
+        self.prefix = prefix
 
     def get_all_keys(self):
-        """Get all keys from Redis."""
-        return self.redis_client.keys("*")
+        """Get all keys from Redis, with SCAN so that Redis is not blocked."""
+        return [
+            key[len(self.prefix) :]
+            for key in self.redis_client.scan_iter(match=self.prefix + "*", count=500)
+        ]
 
     def set_value(self, key, value):
-        self.redis_client.set(key, value)
+        return self.redis_client.set(self.prefix + key, value)
 
     def get_value(self, key):
-        return self.redis_client.get(key)
+        return self.redis_client.get(self.prefix + key)
 
     def delete_value(self, key):
-        self.redis_client.delete(key)
+        return self.redis_client.delete(self.prefix + key) > 0
+
+    delete_key = delete_value
 
     @classmethod
     def set_current_key(cls, key):
@@ -31,7 +83,18 @@ class RedisHandler:
     @classmethod
     def get_current_key(cls):
         """Get the current retrieval key."""
-        return cls.current_retrieval_key
+        return _retrieval_key.get() or cls.current_retrieval_key
+
+    @staticmethod
+    @contextmanager
+    def use_retrieval_key(key):
+        """Set the retrieval key for the current thread only, e.g. in a worker
+        serving several sessions at once."""
+        token = _retrieval_key.set(key)
+        try:
+            yield
+        finally:
+            _retrieval_key.reset(token)
 
     @classmethod
     def clear_current_key(cls):
@@ -0,0 +1,208 @@
+"""
+Persistent cache of LLM responses for deterministic chains.
+
+Responses are keyed by (chain, model, prompt template version, rendered
+prompt) and stored in a local SQLite file with an optional shared Redis
+tier. Entries expire after a TTL and the least recently used ones are
+evicted once the cache grows past its size bound.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional, Type
+
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+from redis import Redis, RedisError
+
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import record_cache_lookup
+from src.utils.data_access import get_redis
+
+
+logger = setup_logger(__name__)
+
+
+class ResponseCache:
+    """TTL and size bounded key/value cache in SQLite, optionally backed by Redis."""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: int = 86400,
+        max_entries: int = 10000,
+        redis_connection: Redis = None,
+        redis_prefix: str = "llm_cache:",
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.redis_client = redis_connection
+        self.redis_prefix = redis_prefix
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self.connection.execute(
+                    "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                return row[0]
+            if row:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+        value = self._redis_call("get", self.redis_prefix + key)
+        if value is not None:
+            self._store_local(key, value)
+        return value
+
+    def set(self, key: str, value: str):
+        self._store_local(key, value)
+        self._redis_call("set", self.redis_prefix + key, value, ex=self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM responses")
+
+    def _store_local(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            # Evicting on every write would scan the table, do it periodically
+            if self._writes % 100 == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self.connection.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def _redis_call(self, method: str, *args, **kwargs):
+        if self.redis_client is None:
+            return None
+        try:
+            return getattr(self.redis_client, method)(*args, **kwargs)
+        except RedisError as e:
+            # The shared tier is best effort, the local cache still works
+            logger.warning("LLM cache Redis tier unavailable: %s", e)
+            return None
+
+
+class CachedChain(Runnable):
+    """Wrap a `prompt | model | parser` chain with a `ResponseCache`.
+
+    The cache key covers the chain name, the model, a version of the prompt
+    template and the rendered prompt, so any change to one of them misses.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        prompt,
+        chain: Runnable,
+        model,
+        cache: ResponseCache,
+        output_type: Type[BaseModel] = None,
+    ):
+        self.name = name
+        self.prompt = prompt
+        self.chain = chain
+        self.model_name = getattr(model, "model", type(model).__name__)
+        self.cache = cache
+        self.output_type = output_type
+        template = json.dumps(prompt.to_json(), sort_keys=True, default=str)
+        self.template_version = hashlib.sha256(
+            (template + os.getenv("LLM_CACHE_VERSION", "")).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def _key(self, input) -> str:
+        rendered = self.prompt.invoke(input).to_string()
+        material = "\0".join(
+            [self.name, self.model_name, self.template_version, rendered]
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _encode(self, output) -> str:
+        if self.output_type is not None:
+            return output.model_dump_json()
+        return output
+
+    def _decode(self, value: str):
+        if self.output_type is not None:
+            return self.output_type.model_validate_json(value)
+        return value
+
+    def invoke(self, input, config=None, **kwargs):
+        key = self._key(input)
+        cached = self.cache.get(key)
+        record_cache_lookup(f"llm_{self.name}", cached is not None)
+        if cached is not None:
+            return self._decode(cached)
+
+        output = self.chain.invoke(input, config, **kwargs)
+        if output is not None:
+            self.cache.set(key, self._encode(output))
+        return output
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None if it is disabled.
+
+    Configured with LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES and LLM_CACHE_REDIS (whether to share the cache
+    through Redis).
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    use_redis = os.getenv("LLM_CACHE_REDIS", "false").lower() in ("1", "true", "yes")
+    return ResponseCache(
+        os.getenv("LLM_CACHE_PATH", "fixtures/llm_cache.sqlite3"),
+        ttl=int(os.getenv("LLM_CACHE_TTL", 86400)),
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000)),
+        redis_connection=get_redis() if use_redis else None,
+    )
+
+
+def cache_chain(name: str, prompt, chain: Runnable, model, output_type=None):
+    """Wrap a chain with the response cache if it is enabled."""
+    cache = get_response_cache()
+    if cache is None:
+        return chain
+    return CachedChain(name, prompt, chain, model, cache, output_type=output_type)
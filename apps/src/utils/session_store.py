@@ -0,0 +1,83 @@
+"""
+Chat page session state kept in Redis.
+
+The serialisable part of a browser session (timer, messages, selected keys,
+feedback and the supervisor's running assessment) is stored as JSON under
+"session:<sid>", where the sid travels in the page URL. Any Streamlit
+replica can then pick up a session after a restart or behind a non-sticky
+load balancer, and rebuild the agents from it; the RAG agent's chat memory
+is already kept in Redis by `src.services.memory`.
+"""
+
+import json
+from typing import Dict, Mapping, Optional
+
+from redis import Redis, RedisError
+
+from src.utils.log_handler import setup_logger
+
+
+logger = setup_logger(__name__)
+
+# Session state fields persisted across replicas, everything else
+# (agents, widget state) is rebuilt from them
+SESSION_FIELDS = (
+    "timer_duration_minutes",
+    "timer_running",
+    "start_time",
+    "duration_seconds",
+    "messages",
+    "warning_sent",
+    "time_up",
+    "scenarios_description",
+    "supervisor_instructions",
+    "feedback_cache",
+    "transcript_saved",
+    "chat_session_id",
+    "scenarios_key",
+    "supervisor_key",
+    "vector_search_key",
+    "session_scenarios_key",
+    "session_supervisor_key",
+    "session_vector_search_key",
+    "last_audio_digest",
+    "last_text",
+    "supervisor_state",
+)
+
+
+class SessionStore:
+    """Save and load the persisted fields of page sessions."""
+
+    def __init__(
+        self, redis_connection: Redis, prefix: str = "session:", ttl: int = 86400
+    ):
+        self.redis_client = redis_connection
+        self.prefix = prefix
+        self.ttl = ttl
+
+    @staticmethod
+    def dumps(state: Mapping) -> str:
+        return json.dumps(
+            {field: state.get(field) for field in SESSION_FIELDS},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+
+    def load(self, sid: str) -> Optional[Dict]:
+        try:
+            value = self.redis_client.get(self.prefix + sid)
+        except RedisError as e:
+            logger.warning("Failed to load session %s: %s", sid, e)
+            return None
+        return json.loads(value) if value else None
+
+    def save(self, sid: str, payload: str):
+        """Store a payload made by `dumps`, refreshing the session's TTL."""
+        try:
+            self.redis_client.set(self.prefix + sid, payload, ex=self.ttl)
+        except RedisError as e:
+            logger.warning("Failed to save session %s: %s", sid, e)
+
+    def delete(self, sid: str):
+        self.redis_client.delete(self.prefix + sid)
@@ -0,0 +1,46 @@
+"""
+Archive of finished chat session transcripts in Redis.
+
+Each transcript is stored as JSON under "transcript:<session id>" with the
+scenario and supervisor keys it was run with, so that past sessions can be
+re-scored offline (see `scripts/batch_evaluate.py`).
+"""
+
+import json
+import time
+from typing import Dict, Iterator, List
+
+from redis import Redis
+
+
+class TranscriptStore:
+    """Save and iterate chat transcripts stored in Redis."""
+
+    def __init__(self, redis_connection: Redis, prefix: str = "transcript:"):
+        self.redis_client = redis_connection
+        self.prefix = prefix
+
+    def save(
+        self,
+        session_id: str,
+        messages: List[Dict],
+        scenarios_key: str = None,
+        supervisor_key: str = None,
+    ):
+        record = {
+            "id": session_id,
+            "scenarios_key": scenarios_key,
+            "supervisor_key": supervisor_key,
+            "messages": messages,
+            "ended_at": time.time(),
+        }
+        self.redis_client.set(
+            self.prefix + session_id, json.dumps(record, ensure_ascii=False)
+        )
+
+    def iter_transcripts(self, pattern: str = "*") -> Iterator[Dict]:
+        """Yield the stored transcripts whose session id matches the pattern."""
+        for key in self.redis_client.scan_iter(match=self.prefix + pattern, count=500):
+            value = self.redis_client.get(key)
+            if value:
+                yield json.loads(value)
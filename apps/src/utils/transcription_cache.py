@@ -0,0 +1,98 @@
+"""
+Content-addressed cache of transcriptions.
+
+Transcripts are keyed by (ASR engine, SHA-256 of the audio), so the same clip
+is never sent to the ASR twice, whether it comes back on a Streamlit rerun
+or from another session. Entries live in a bounded in-memory LRU, with an
+optional Redis tier shared between processes.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from redis import Redis, RedisError
+
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import record_cache_lookup
+from src.utils.data_access import get_redis
+
+
+logger = setup_logger(__name__)
+
+
+def audio_digest(audio: bytes) -> str:
+    """Digest identifying a recording by its content."""
+    return hashlib.sha256(audio).hexdigest()
+
+
+class TranscriptionCache:
+    """LRU cache of transcripts, optionally backed by Redis."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        redis_connection: Redis = None,
+        ttl: int = 86400,
+        prefix: str = "transcription:",
+    ):
+        self.max_entries = max_entries
+        self.redis_client = redis_connection
+        self.ttl = ttl
+        self.prefix = prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, engine: str, digest: str) -> Optional[str]:
+        key = f"{engine}:{digest}"
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+        if text is None and self.redis_client is not None:
+            try:
+                text = self.redis_client.get(self.prefix + key)
+            except RedisError as e:
+                logger.warning("Failed to read cached transcription: %s", e)
+            if text is not None:
+                self._remember(key, text)
+        record_cache_lookup("transcription", text is not None)
+        return text
+
+    def set(self, engine: str, digest: str, text: str):
+        key = f"{engine}:{digest}"
+        self._remember(key, text)
+        if self.redis_client is not None:
+            try:
+                self.redis_client.set(self.prefix + key, text, ex=self.ttl)
+            except RedisError as e:
+                logger.warning("Failed to cache transcription: %s", e)
+
+    def _remember(self, key: str, text: str):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@lru_cache(maxsize=1)
+def get_transcription_cache() -> TranscriptionCache:
+    """Return the process-wide transcription cache.
+
+    Configured with TRANSCRIPTION_CACHE_MAX_ENTRIES, TRANSCRIPTION_CACHE_TTL
+    and TRANSCRIPTION_CACHE_REDIS (whether to share the cache through Redis).
+    """
+    use_redis = os.getenv("TRANSCRIPTION_CACHE_REDIS", "false").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    return TranscriptionCache(
+        max_entries=int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", 1024)),
+        redis_connection=get_redis() if use_redis else None,
+        ttl=int(os.getenv("TRANSCRIPTION_CACHE_TTL", 86400)),
+    )
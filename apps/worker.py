@@ -0,0 +1,176 @@
+"""
+Worker service running chat turns and evaluations off the Streamlit process.
+
+Jobs are consumed from the Redis stream of `src.utils.job_queue`, so any
+number of workers can be started, on any host, independently of the UI:
+    python worker.py --concurrency 4
+
+The chatbot page submits its jobs here when CHAT_EXECUTION=worker.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from src.agents.rag_agent import SelfRAGWorkflow
+from src.agents.supervisor_agent import SupervisorAgent
+from src.services.memory import chat_turn
+from src.utils.job_queue import JobQueue, get_job_queue
+from src.utils.log_handler import setup_logger
+from src.utils.metrics import configure_metrics, track_stage
+from src.utils.redis_handler import RedisHandler
+
+
+logger = setup_logger(__name__)
+
+
+def convert_to_langchain_messages(messages: List[Dict]) -> List[BaseMessage]:
+    """Convert the session state messages to langchain message objects"""
+    lc_messages = []
+    for message in messages:
+        if message["role"] == "user":
+            lc_messages.append(HumanMessage(content=message["content"]))
+        elif message["role"] == "assistant":
+            lc_messages.append(AIMessage(content=message["content"]))
+    return lc_messages
+
+
+class Worker:
+    """Run the jobs of a queue on a pool of threads."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        consumer: str,
+        concurrency: int = 4,
+        max_workflows: int = 256,
+    ):
+        self.queue = queue
+        self.consumer = consumer
+        self.concurrency = concurrency
+        self.max_workflows = max_workflows
+        self.stop_event = threading.Event()
+        self.handlers = {
+            "chat_turn": self.chat_turn,
+            "evaluate": self.evaluate,
+        }
+        self._workflows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_workflow(self, session_id: str, scenarios_description: str):
+        """The session's workflow, reused across its turns on this worker."""
+        key = (session_id, scenarios_description)
+        with self._lock:
+            workflow = self._workflows.get(key)
+            if workflow is None:
+                workflow = SelfRAGWorkflow(
+                    session_id=session_id, scenarios_description=scenarios_description
+                )
+                self._workflows[key] = workflow
+            self._workflows.move_to_end(key)
+            while len(self._workflows) > self.max_workflows:
+                self._workflows.popitem(last=False)
+        return workflow
+
+    def chat_turn(self, job_id: str, payload: Dict) -> Dict:
+        workflow = self._get_workflow(
+            payload["session_id"], payload["scenarios_description"]
+        )
+        initial_state = SelfRAGWorkflow.create_initial_state(
+            convert_to_langchain_messages(payload["messages"])
+        )
+        # A retried turn must not add its messages to the memory twice
+        with RedisHandler.use_retrieval_key(payload["vector_key"]), chat_turn(job_id):
+            response = workflow.workflow.invoke(initial_state)
+        return {"content": response["messages"][-1].content}
+
+    def evaluate(self, job_id: str, payload: Dict) -> Dict:
+        # The whole transcript is evaluated in one call, not turn by turn
+        agent = SupervisorAgent(
+            scenarios_description=payload["scenarios_description"],
+            supervisor_instructions=payload["supervisor_instructions"],
+            incremental=False,
+        )
+        response = agent.workflow.invoke(
+            {
+                "chat_history": convert_to_langchain_messages(payload["messages"]),
+                "feedback": "",
+            }
+        )
+        return {"feedback": response["feedback"]}
+
+    def run_once(self, consumer: str, block: float = 5) -> bool:
+        """Run the next job, if any arrives within `block` seconds."""
+        claimed = self.queue.claim(consumer, block=block)
+        if claimed is None:
+            return False
+        message_id, job = claimed
+        if self.queue.is_done(job["id"]):
+            # Redelivered after its result was stored
+            self.queue.acknowledge(message_id)
+            return True
+        try:
+            handler = self.handlers[job["kind"]]
+            with track_stage("job", job["kind"]):
+                result = handler(job["id"], job["payload"])
+        except Exception as e:
+            self.queue.fail(message_id, job, e)
+        else:
+            self.queue.complete(message_id, job["id"], result)
+        return True
+
+    def _loop(self, consumer: str):
+        while not self.stop_event.is_set():
+            try:
+                self.run_once(consumer, block=1)
+            except Exception as e:
+                logger.error(f"Worker {consumer} failed: {str(e)}", exc_info=True)
+                self.stop_event.wait(1)
+
+    def run(self):
+        self.queue.ensure_group()
+        threads = [
+            threading.Thread(
+                target=self._loop, args=(f"{self.consumer}-{i}",), name=f"worker-{i}"
+            )
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info(f"Worker {self.consumer} started with {self.concurrency} threads")
+        for thread in threads:
+            thread.join()
+        logger.info(f"Worker {self.consumer} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("WORKER_CONCURRENCY", 4)),
+        help="Jobs run at the same time by this worker",
+    )
+    parser.add_argument(
+        "--consumer",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="Name of this worker in the consumer group",
+    )
+    args = parser.parse_args()
+
+    configure_metrics()
+    worker = Worker(get_job_queue(), args.consumer, concurrency=args.concurrency)
+    # Finish the running jobs on shutdown, the others are redelivered
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop_event.set())
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()